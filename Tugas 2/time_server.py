@@ -1,8 +1,57 @@
 import socket
+import selectors
 import threading
 import logging
+import sys
+import time
 from datetime import datetime
 
+# Mode selector: berhenti membaca dari client selama outbuf-nya di atas batas ini
+# (client yang pipelining tanpa membaca response tidak membuat memori terus naik)
+BATAS_OUTBUF = 64 * 1024
+
+# Response JAM di-cache dan hanya dibuat ulang sekali per detik
+_jam_cache = (None, b"")
+
+def jam_response():
+    global _jam_cache
+    detik = int(time.time())
+    cached_detik, response = _jam_cache
+    if cached_detik != detik:
+        # Ambil waktu saat ini dalam format hh:mm:ss
+        waktu = datetime.fromtimestamp(detik).strftime("%H:%M:%S")
+        response = f"JAM {waktu}\r\n".encode('utf-8')
+        _jam_cache = (detik, response)
+    return response
+
+def proses_baris(inbuf):
+    # Proses semua baris lengkap di inbuf (bytearray), baris yang belum
+    # lengkap tetap disimpan di inbuf untuk recv berikutnya.
+    # Return: (response bytes, jumlah request TIME, apakah ada QUIT)
+    response = bytearray()
+    jumlah_time = 0
+    lines = []
+    idx = inbuf.rfind(b"\r\n")
+    if idx >= 0:
+        lines = inbuf[:idx].split(b"\r\n")
+        del inbuf[:idx + 2]
+    for line in lines:
+        if line == b"TIME":
+            response += jam_response()
+            jumlah_time += 1
+        elif line == b"QUIT":
+            # Command setelah QUIT diabaikan
+            inbuf.clear()
+            return response, jumlah_time, True
+        else:
+            # Respon jika request tidak valid
+            response += b"Invalid request\r\n"
+    # Batasi buffer jika client mengirim data tanpa \r\n
+    if len(inbuf) > 1024:
+        inbuf.clear()
+        response += b"Invalid request\r\n"
+    return response, jumlah_time, False
+
 class ProcessTheClient(threading.Thread):
     def __init__(self, connection, address):
         self.connection = connection
@@ -10,55 +59,155 @@ class ProcessTheClient(threading.Thread):
         threading.Thread.__init__(self)
 
     def run(self):
+        inbuf = bytearray()
         try:
             while True:
-                # Menerima data, 32 bytes cukup untuk request TIME/QUIT
-                data = self.connection.recv(32)
+                data = self.connection.recv(4096)
                 if not data:
                     break
-                request = data.decode('utf-8')
-
-                # Cek request sesuai ketentuan
-                if request == "TIME\r\n":
-                    logging.warning(f"Client {self.address} requested TIME")
-                    # Ambil waktu saat ini dalam format hh:mm:ss
-                    now = datetime.now()
-                    waktu = now.strftime("%H:%M:%S")
-                    # Format response
-                    response = f"JAM {waktu}\r\n"
-                    self.connection.sendall(response.encode('utf-8'))
-                elif request == "QUIT\r\n":
+                inbuf += data
+                # Satu batch bisa berisi beberapa command (pipelining),
+                # semua dijawab sekaligus dengan satu sendall
+                response, jumlah_time, quit = proses_baris(inbuf)
+                if jumlah_time:
+                    logging.warning(f"Client {self.address} requested TIME x{jumlah_time}")
+                if response:
+                    self.connection.sendall(response)
+                if quit:
                     # Jika request quit, langsung tutup koneksi
                     break
-                else:
-                    # Respon jika request tidak valid
-                    self.connection.sendall(b"Invalid request\r\n")
         except Exception as e:
             logging.error(f"Error: {e}")
         finally:
             self.connection.close()
             logging.warning(f"Connection closed: {self.address}")
 
+class ClientState:
+    # State per koneksi untuk mode selector: buffer baca dan antrian tulis
+    def __init__(self, connection, address):
+        self.connection = connection
+        self.address = address
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.closing = False
+        self.events = selectors.EVENT_READ
+
+    def process_lines(self):
+        if self.closing:
+            # Sudah QUIT: data yang datang setelahnya tidak diproses lagi
+            self.inbuf.clear()
+            return
+        response, jumlah_time, quit = proses_baris(self.inbuf)
+        self.outbuf += response
+        if quit:
+            # Tutup koneksi setelah semua response sebelumnya terkirim
+            self.closing = True
+
 class TimeServer(threading.Thread):
-    def __init__(self, port=45000):
+    def __init__(self, port=45000, mode='thread', backlog=5):
+        # mode 'thread': satu thread per koneksi
+        # mode 'selector': satu thread, event-driven (epoll di Linux)
         self.the_clients = []
         self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         threading.Thread.__init__(self)
         self.port = port
+        self.mode = mode
+        self.backlog = backlog
 
     def run(self):
         self.my_socket.bind(('0.0.0.0', self.port))
-        self.my_socket.listen(5)
-        logging.warning(f"Time Server running on port {self.port}...")
+        self.my_socket.listen(self.backlog)
+        logging.warning(f"Time Server running on port {self.port} ({self.mode} mode)...")
+        if self.mode == 'selector':
+            self.run_selector()
+            return
         while True:
             connection, client_address = self.my_socket.accept()
             logging.warning(f"Connection from {client_address}")
             clt = ProcessTheClient(connection, client_address)
             clt.start()
+            # Buang thread yang sudah selesai agar list tidak terus membesar
+            self.the_clients = [c for c in self.the_clients if c.is_alive()]
             self.the_clients.append(clt)
 
+    def run_selector(self):
+        # DefaultSelector otomatis memakai epoll di Linux, kqueue di BSD/macOS
+        self.selector = selectors.DefaultSelector()
+        self.my_socket.setblocking(False)
+        self.selector.register(self.my_socket, selectors.EVENT_READ, None)
+        while True:
+            for key, mask in self.selector.select():
+                if key.data is None:
+                    self.accept_client()
+                    continue
+                state = key.data
+                if mask & selectors.EVENT_READ:
+                    self.read_client(state)
+                if mask & selectors.EVENT_WRITE and state.connection.fileno() != -1:
+                    self.write_client(state)
+
+    def accept_client(self):
+        # Terima semua koneksi yang sedang antri
+        while True:
+            try:
+                connection, client_address = self.my_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            connection.setblocking(False)
+            state = ClientState(connection, client_address)
+            self.selector.register(connection, selectors.EVENT_READ, state)
+
+    def read_client(self, state):
+        try:
+            data = state.connection.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            logging.error(f"Error: {e}")
+            self.close_client(state)
+            return
+        if not data:
+            self.close_client(state)
+            return
+        state.inbuf += data
+        state.process_lines()
+        self.write_client(state)
+
+    def write_client(self, state):
+        if state.outbuf:
+            try:
+                sent = state.connection.send(state.outbuf)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError as e:
+                logging.error(f"Error: {e}")
+                self.close_client(state)
+                return
+            del state.outbuf[:sent]
+        if not state.outbuf and state.closing:
+            self.close_client(state)
+            return
+        # Minta EVENT_WRITE hanya selama masih ada sisa data yang belum terkirim,
+        # EVENT_READ dilepas selama outbuf di atas BATAS_OUTBUF (backpressure)
+        events = 0
+        if len(state.outbuf) < BATAS_OUTBUF:
+            events |= selectors.EVENT_READ
+        if state.outbuf:
+            events |= selectors.EVENT_WRITE
+        if events != state.events:
+            self.selector.modify(state.connection, events, state)
+            state.events = events
+
+    def close_client(self, state):
+        self.selector.unregister(state.connection)
+        state.connection.close()
+
 def main():
-    svr = TimeServer()
+    # python time_server.py [thread|selector]
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'thread'
+    backlog = 1024 if mode == 'selector' else 5
+    svr = TimeServer(mode=mode, backlog=backlog)
     svr.start()
 
 if __name__ == "__main__":
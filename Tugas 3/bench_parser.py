@@ -0,0 +1,73 @@
+import sys
+import time
+import base64
+import shlex
+
+from file_protocol import parse_command
+
+"""
+benchmark parsing request UPLOAD: shlex.split (cara lama) vs parse_command
+
+cara pakai:
+  python bench_parser.py [ukuran_mb ...]
+  default ukuran 1 10 100 MB (ukuran file sebelum di-encode base64)
+
+shlex.split membangun token satu karakter demi satu karakter
+(token = token + nextchar), sehingga waktunya tumbuh kuadratik terhadap ukuran
+request. shlex hanya diukur pada ukuran kecil (SHLEX_UKURAN_KB), lalu waktu untuk
+ukuran besar diperkirakan dengan fit kuadratik t = a*n^2 + b*n dari pengukuran
+tersebut (ditandai ~, hanya perkiraan)
+"""
+
+SHLEX_UKURAN_KB = [32, 64, 128, 256]
+
+
+def buat_request(ukuran_kb):
+    isi = bytes(range(256)) * (ukuran_kb * 1024 // 256)
+    filedata_b64 = base64.b64encode(isi).decode()
+    return f'UPLOAD file_{ukuran_kb}kb.bin "{filedata_b64}"'
+
+
+def ukur(fungsi, data):
+    mulai = time.perf_counter()
+    hasil = fungsi(data)
+    return time.perf_counter() - mulai, hasil
+
+
+def fit_kuadrat(titik):
+    # least squares untuk t = a*n^2 + b*n dari pasangan (n, t)
+    s4 = sum(n ** 4 for n, _ in titik)
+    s3 = sum(n ** 3 for n, _ in titik)
+    s2 = sum(n ** 2 for n, _ in titik)
+    y2 = sum(t * n * n for n, t in titik)
+    y1 = sum(t * n for n, t in titik)
+    det = s4 * s2 - s3 * s3
+    a = (y2 * s2 - s3 * y1) / det
+    b = (s4 * y1 - s3 * y2) / det
+    return lambda n: a * n * n + b * n
+
+
+def main():
+    ukuran_list = [int(x) for x in sys.argv[1:]] or [1, 10, 100]
+
+    print("pengukuran shlex.split (untuk perkiraan ukuran besar):")
+    titik = []
+    for ukuran_kb in SHLEX_UKURAN_KB:
+        request = buat_request(ukuran_kb)
+        waktu_lama, token_lama = ukur(shlex.split, request)
+        _, token_baru = ukur(parse_command, request.encode())
+        assert [t.tobytes().decode() for t in token_baru] == token_lama
+        titik.append((ukuran_kb / 1024, waktu_lama))
+        print(f"{ukuran_kb:>6}KB {waktu_lama:>10.3f}s")
+    perkiraan = fit_kuadrat(titik)
+
+    print(f"{'ukuran':>8} {'shlex.split':>14} {'parse_command':>14} {'speedup':>10}")
+    for ukuran_mb in ukuran_list:
+        request_bytes = buat_request(ukuran_mb * 1024).encode()
+        waktu_lama = perkiraan(ukuran_mb)
+        waktu_baru, _ = ukur(parse_command, request_bytes)
+        print(f"{ukuran_mb:>6}MB ~{waktu_lama:>12.1f}s {waktu_baru:>13.4f}s {waktu_lama / waktu_baru:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,44 +2,206 @@ import socket
 import json
 import base64
 import logging
+import os
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from file_protocol import SocketReader, pack_frame, TERMINATOR, CHUNKED, \
+    block_chunks, deflate_chunks, inflate_chunks, should_compress
+from file_interface import CHUNK_SIZE
 
 server_address=('0.0.0.0',7777)
+# 2: GET/UPLOAD memakai frame biner v2, 1: protokol teks lama (JSON + base64)
+protocol_version=2
+# sebelum upload, tanyakan dulu ke server apakah isi file yang sama sudah ada (LINK).
+# default mati karena dedup di server juga default mati (FILE_SERVER_DEDUP),
+# aktifkan hanya jika server dijalankan dengan dedup
+dedup_probe=False
+# level kompresi deflate untuk GET/UPLOAD v2 (1-9), 0: tanpa kompresi
+compress_level=0
+
+# jumlah koneksi yang disimpan di pool untuk dipakai ulang
+pool_size=4
+
+
+class ConnectionPool:
+    """
+    pool koneksi ke server, aman dipakai dari banyak thread;
+    koneksi yang selesai dipakai dikembalikan ke pool, bukan ditutup
+    """
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def ambil(self):
+        # return (sock, reader, baru), koneksi idle terakhir dipakai lebih dulu
+        with self.lock:
+            if self.idle:
+                sock, reader = self.idle.pop()
+                return sock, reader, False
+        sock = socket.create_connection(server_address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        logging.warning(f"connecting to {server_address}")
+        return sock, SocketReader(sock), True
+
+    def kembalikan(self, sock, reader):
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append((sock, reader))
+                return
+        sock.close()
+
+    def buang(self, sock):
+        sock.close()
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for sock, reader in idle:
+            sock.close()
+
+
+pool = ConnectionPool(pool_size)
+
+
+def close_connection():
+    pool.close_all()
+
+
+def is_busy(hasil):
+    if isinstance(hasil, tuple):
+        hasil = hasil[0]
+    return isinstance(hasil, dict) and hasil.get('status') == 'BUSY'
+
+
+def request(kirim_dan_terima):
+    # jalankan satu request memakai koneksi dari pool;
+    # jika koneksi lama ternyata sudah diputus server, coba sekali lagi dengan koneksi lain
+    for percobaan in range(2):
+        sock, reader, baru = pool.ambil()
+        try:
+            hasil = kirim_dan_terima(sock, reader)
+        except ConnectionError as e:
+            pool.buang(sock)
+            if baru or percobaan:
+                raise
+            logging.warning(f"koneksi lama terputus ({e}), menyambung ulang")
+            continue
+        except BaseException:
+            pool.buang(sock)
+            raise
+        if is_busy(hasil):
+            # server menolak dan menutup koneksi
+            pool.buang(sock)
+        else:
+            pool.kembalikan(sock, reader)
+        return hasil
+
 
 def send_command(command_str=""):
-    global server_address
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.connect(server_address)
-    logging.warning(f"connecting to {server_address}")
-    try:
+    def kirim_dan_terima(sock, reader):
         logging.warning(f"sending message ")
-        sock.sendall(command_str.encode())
-        # Look for the response, waiting until socket is done (no more data)
-        data_received="" #empty string
-        while True:
-            #socket does not receive all data at once, data comes in part, need to be concatenated at the end of process
-            data = sock.recv(1024)
-            if data:
-                #data is not empty, concat with previous content
-                data_received += data.decode()
-                if "\r\n\r\n" in data_received:
-                    break
-            else:
-                # no more data, stop the process by break
-                break
-        # at this point, data_received (string) will contain all data coming from the socket
-        # to be able to use the data_received as a dict, need to load it using json.loads()
-        hasil = json.loads(data_received)
+        sock.sendall(command_str.encode() + TERMINATOR)
+        # response diakhiri \r\n\r\n, sisa bytes setelahnya tetap di buffer reader
+        data_received = reader.read_until(TERMINATOR)
+        if data_received is None:
+            raise ConnectionError("koneksi ditutup server")
+        return json.loads(data_received)
+    try:
+        hasil = request(kirim_dan_terima)
         logging.warning("data received from server:")
         return hasil
-    except:
+    except Exception:
         logging.warning("error during data receiving")
         return False
 
 
+def open_at(path, offset=None):
+    # offset None: file ditulis ulang dari awal
+    # offset N: file tidak dipotong, penulisan dimulai di posisi N
+    if offset is None:
+        return open(path, 'wb')
+    f = os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT, 0o644), 'wb')
+    f.seek(offset)
+    return f
+
+
+def set_mtime(path, mtime):
+    # mtime file lokal disamakan dengan file di server (juga jika download terputus),
+    # remote_resume_get memakainya untuk memastikan file lokal bagian dari file yang sama
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def sama_mtime(a, b):
+    # mtime dikirim sebagai float detik, bisa bergeser sedikit setelah os.utime
+    return abs(a - b) < 1e-6
+
+
+def sendfile_exact(sock, f, offset, count):
+    # kirim tepat count bytes file mulai offset (panjang yang sudah diumumkan di frame);
+    # count=0 tidak boleh diteruskan ke sendfile karena berarti sampai akhir file
+    if count and sock.sendfile(f, offset, count) < count:
+        # file memendek saat dikirim, frame tidak bisa dilengkapi lagi
+        raise OSError(f"file berubah saat dikirim, kurang dari {count} bytes")
+
+
+def send_frame(header, infile=None, outpath=None, stats=None, offset=0, outoffset=None):
+    # protokol v2: kirim header JSON, payload di-stream dari infile (file object) mulai offset
+    # jika outpath diisi, payload balasan di-stream langsung ke file tersebut mulai outoffset
+    # stats (dict) diisi ukuran raw dan compressed jika payload dikompres
+    # return (header, payload bytes)
+    def kirim_dan_terima(sock, reader):
+        logging.warning(f"sending frame {header['request']}")
+        if infile:
+            infile.seek(offset)
+        if infile and header.get('encoding') == 'deflate':
+            # isi file dikompres sambil dikirim, panjangnya belum diketahui
+            sock.sendall(pack_frame(header, CHUNKED))
+            data = iter(lambda: infile.read(CHUNK_SIZE), b'')
+            for block in block_chunks(deflate_chunks(data, compress_level, stats)):
+                sock.sendall(block)
+        else:
+            panjang = os.fstat(infile.fileno()).st_size - offset if infile else 0
+            sock.sendall(pack_frame(header, panjang))
+            if infile:
+                sendfile_exact(sock, infile, offset, panjang)
+        hasil, panjang_balik = reader.read_header()
+        payload = reader.iter_payload(panjang_balik)
+        if hasil.get('encoding') == 'deflate':
+            payload = inflate_chunks(payload, stats)
+        if outpath and hasil['status'] == 'OK':
+            try:
+                with open_at(outpath, outoffset) as f:
+                    for chunk in payload:
+                        f.write(chunk)
+            finally:
+                set_mtime(outpath, hasil.get('mtime'))
+            return hasil, b''
+        return hasil, b''.join(payload)
+    try:
+        hasil, payload = request(kirim_dan_terima)
+        logging.warning("data received from server:")
+        return hasil, payload
+    except Exception as e:
+        logging.warning(f"error during data receiving: {e}")
+        return False, b''
+
+
+def hasil_ok(hasil, data_type=None):
+    # reply yang bisa dipakai: dict dengan status OK (bukan False, ERROR atau BUSY),
+    # data_type: tipe data yang diharapkan, misal list untuk MGET/MPUT
+    if not isinstance(hasil, dict) or hasil.get('status') != 'OK':
+        return False
+    return data_type is None or isinstance(hasil.get('data'), data_type)
+
 def remote_list():
     command_str=f"LIST"
     hasil = send_command(command_str)
-    if (hasil['status']=='OK'):
+    if hasil_ok(hasil, list):
         print("daftar file : ")
         for nmfile in hasil['data']:
             print(f"- {nmfile}")
@@ -48,50 +210,273 @@ def remote_list():
         print("Gagal")
         return False
 
-def remote_get(filename=""):
-    command_str=f"GET {filename}"
+def remote_get(filename="", offset=None, length=None):
+    # offset/length: hanya ambil sebagian file dan tulis di posisi yang sama pada file lokal
+    rentang = [] if offset is None else [offset] + ([] if length is None else [length])
+    if protocol_version==2:
+        #isi file di-stream langsung dari socket ke disk
+        header = dict(request='GET',params=[filename, *rentang])
+        stats = {}
+        if compress_level:
+            header['compress'] = compress_level
+        hasil, _ = send_frame(header, outpath=filename, stats=stats, outoffset=offset)
+        if (hasil and hasil['status']=='OK'):
+            print_stats(filename, stats)
+            return True
+        print("Gagal")
+        return False
+    command_str=" ".join(["GET", filename, *map(str, rentang)])
     hasil = send_command(command_str)
-    if (hasil['status']=='OK'):
+    if hasil_ok(hasil):
         #proses file dalam bentuk base64 ke bentuk bytes
         namafile= hasil['data_namafile']
         isifile = base64.b64decode(hasil['data_file'])
-        fp = open(namafile,'wb+')
+        fp = open_at(namafile, offset)
         fp.write(isifile)
         fp.close()
+        set_mtime(namafile, hasil.get('mtime'))
         return True
     else:
         print("Gagal")
         return False
 
-def remote_upload(filename):
+def remote_stat_info(filename):
+    # return hasil STAT (data_size, mtime), None jika file tidak ada
+    if protocol_version == 2:
+        hasil, _ = send_frame(dict(request='STAT', params=[filename]))
+    else:
+        hasil = send_command(f"STAT {filename}")
+    if hasil and hasil['status'] == 'OK':
+        return hasil
+    return None
+
+def remote_stat(filename):
+    # return ukuran file di server, None jika file tidak ada
+    hasil = remote_stat_info(filename)
+    return None if hasil is None else hasil['data_size']
+
+def remote_resume_get(filename):
+    # lanjutkan download yang terputus: ambil mulai ukuran file lokal saat ini,
+    # hanya jika ukuran dan mtime file lokal menunjukkan file yang sama dengan di server
+    info = remote_stat_info(filename)
+    if info is None:
+        print("Gagal")
+        return False
+    size = info['data_size']
+    offset = None
+    if os.path.exists(filename):
+        st = os.stat(filename)
+        if st.st_size <= size and sama_mtime(st.st_mtime, info['mtime']):
+            offset = st.st_size
+    if offset is None:
+        # file di server sudah berubah (atau file lokal bukan hasil download):
+        # download ulang dari awal, file lokal dipotong
+        print(f"{filename} berbeda dengan file di server, download ulang dari awal")
+        return remote_get(filename)
+    if offset == size:
+        print(f"{filename} sudah lengkap ({size} bytes)")
+        return True
+    print(f"melanjutkan {filename} mulai byte {offset} dari {size}")
+    return remote_get(filename, offset)
+
+def remote_range_get(filename, parts=pool_size):
+    # download satu file besar sebagai beberapa range paralel, masing-masing di koneksi sendiri
+    size = remote_stat(filename)
+    if size is None:
+        print("Gagal")
+        return False
+    with open_at(filename, 0) as f:
+        f.truncate(size)
+    step = max(1, -(-size // parts))
+    ranges = [(offset, min(step, size - offset)) for offset in range(0, size, step)]
+    pool.max_idle = max(pool.max_idle, parts)
+    with ThreadPoolExecutor(max_workers=parts) as executor:
+        hasil = list(executor.map(lambda r: remote_get(filename, *r), ranges))
+    return all(hasil)
+
+def print_stats(filename, stats):
+    if stats:
+        persen = stats['compressed'] * 100 / stats['raw'] if stats['raw'] else 100
+        print(f"{filename}: {stats['raw']} bytes, terkirim {stats['compressed']} bytes ({persen:.0f}%)")
+
+def file_digest(filename):
+    hasher = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def remote_link(filename, digest):
+    # return hasil LINK, status OK berarti server sudah punya isi file tersebut
+    if protocol_version == 2:
+        hasil, _ = send_frame(dict(request='LINK', params=[filename, digest]))
+        return hasil
+    return send_command(f"LINK {filename} {digest}")
+
+def remote_upload(filename, offset=None):
+    # offset: isi file dikirim mulai offset dan ditulis di server mulai offset yang sama
+    global dedup_probe
+    rentang = [] if offset is None else [offset]
     try:
-        with open(filename, 'rb') as f:
-            filedata = f.read()
-        filedata_b64 = base64.b64encode(filedata).decode()
-        # Bungkus base64 dengan tanda kutip agar tidak terpecah di server
-        command_str = f'UPLOAD {filename} "{filedata_b64}"'
-        hasil = send_command(command_str)
-        if hasil['status'] == 'OK':
+        if offset is not None:
+            size = os.path.getsize(filename)
+            if offset < 0 or offset > size:
+                print(f"Gagal upload: offset {offset} di luar ukuran file {size}")
+                return False
+        if dedup_probe and offset is None:
+            hasil = remote_link(filename, file_digest(filename))
+            if hasil and hasil['status'] == 'OK':
+                # isi file tidak perlu dikirim
+                print(hasil['data'])
+                return True
+            if hasil and 'dedup tidak aktif' in str(hasil.get('data')):
+                # server tidak memakai dedup: jangan hitung sha256 dan kirim LINK lagi
+                dedup_probe = False
+        if protocol_version == 2:
+            # isi file dikirim langsung dari disk (sendfile), tanpa dibaca ke memori,
+            # atau dikompres per chunk jika compress_level diisi
+            header = dict(request='UPLOAD', params=[filename, *rentang])
+            stats = {}
+            if compress_level and should_compress(filename):
+                header['encoding'] = 'deflate'
+            with open(filename, 'rb') as f:
+                hasil, _ = send_frame(header, infile=f, stats=stats, offset=offset or 0)
+            print_stats(filename, stats)
+        else:
+            with open(filename, 'rb') as f:
+                f.seek(offset or 0)
+                filedata = f.read()
+            filedata_b64 = base64.b64encode(filedata).decode()
+            # Bungkus base64 dengan tanda kutip agar tidak terpecah di server
+            command_str = " ".join([f'UPLOAD {filename} "{filedata_b64}"', *map(str, rentang)])
+            hasil = send_command(command_str)
+        if hasil_ok(hasil):
             print(hasil['data'])
             return True
         else:
-            print("Gagal upload:", hasil['data'])
+            print("Gagal upload:", hasil.get('data') if isinstance(hasil, dict) else hasil)
             return False
     except Exception as e:
         print(f"Gagal upload: {e}")
         return False
 
+def remote_resume_upload(filename):
+    # lanjutkan upload yang terputus: kirim mulai ukuran file di server saat ini
+    size = os.path.getsize(filename)
+    offset = remote_stat(filename) or 0
+    if offset > size:
+        offset = 0
+    if offset == size:
+        print(f"{filename} sudah lengkap di server ({size} bytes)")
+        return True
+    print(f"melanjutkan upload {filename} mulai byte {offset} dari {size}")
+    return remote_upload(filename, offset)
+
+def remote_mget(filenames):
+    # ambil banyak file dalam satu request/response
+    if protocol_version == 2:
+        def kirim_dan_terima(sock, reader):
+            sock.sendall(pack_frame(dict(request='MGET', params=filenames)))
+            hasil, _ = reader.read_header()
+            if not hasil_ok(hasil, list):
+                return hasil
+            # payload berisi isi file yang berhasil, berurutan sesuai hasil['data']
+            for info in hasil['data']:
+                if info['status'] == 'OK':
+                    with open(info['data_namafile'], 'wb') as f:
+                        for chunk in reader.iter_exact(info['data_size']):
+                            f.write(chunk)
+            return hasil
+        try:
+            hasil = request(kirim_dan_terima)
+        except Exception as e:
+            print(f"Gagal MGET: {e}")
+            return False
+        if not hasil_ok(hasil, list):
+            print("Gagal MGET:", hasil.get('data') if isinstance(hasil, dict) else hasil)
+            return False
+    else:
+        hasil = send_command("MGET " + " ".join(filenames))
+        if not hasil_ok(hasil, list):
+            print("Gagal MGET:", hasil.get('data') if isinstance(hasil, dict) else hasil)
+            return False
+        for info in hasil['data']:
+            if info['status'] == 'OK':
+                with open(info['data_namafile'], 'wb') as f:
+                    f.write(base64.b64decode(info['data_file']))
+    berhasil = True
+    for info in hasil['data']:
+        if info['status'] == 'OK':
+            print(f"- {info['data_namafile']}: OK ({info['data_size']} bytes)")
+        else:
+            print(f"- {info['data_namafile']}: Gagal, {info['data']}")
+            berhasil = False
+    return berhasil
+
+def remote_mput(filenames):
+    # upload banyak file dalam satu request/response
+    try:
+        if protocol_version == 2:
+            sizes = [os.path.getsize(filename) for filename in filenames]
+            def kirim_dan_terima(sock, reader):
+                sock.sendall(pack_frame(dict(request='MPUT', params=filenames, sizes=sizes), sum(sizes)))
+                for filename, size in zip(filenames, sizes):
+                    with open(filename, 'rb') as f:
+                        sendfile_exact(sock, f, 0, size)
+                hasil, _ = reader.read_header()
+                return hasil
+            hasil = request(kirim_dan_terima)
+        else:
+            bagian = []
+            for filename in filenames:
+                with open(filename, 'rb') as f:
+                    bagian.append(f'{filename} "{base64.b64encode(f.read()).decode()}"')
+            hasil = send_command("MPUT " + " ".join(bagian))
+    except Exception as e:
+        print(f"Gagal MPUT: {e}")
+        return False
+    if not hasil_ok(hasil, list):
+        # False (koneksi gagal), ERROR atau BUSY: tidak ada hasil per file
+        print("Gagal MPUT:", hasil.get('data') if isinstance(hasil, dict) else hasil)
+        return False
+    berhasil = True
+    for info in hasil['data']:
+        print(f"- {info['data_namafile']}: {info['data']}")
+        berhasil = berhasil and info['status'] == 'OK'
+    return berhasil
+
 def remote_delete(filename):
     command_str = f"DELETE {filename}"
     hasil = send_command(command_str)
-    if hasil['status'] == 'OK':
+    if hasil_ok(hasil):
         print(hasil['data'])
         return True
     else:
-        print("Gagal delete:", hasil['data'])
+        print("Gagal delete:", hasil.get('data') if isinstance(hasil, dict) else hasil)
         return False
 
 
+def remote_parallel(aksi, filenames, workers=pool_size):
+    # jalankan aksi (remote_get/remote_upload) untuk banyak file sekaligus,
+    # tiap worker memakai koneksinya sendiri dari pool
+    pool.max_idle = max(pool.max_idle, workers)
+    mulai = time.perf_counter()
+    total_bytes = 0
+    berhasil = True
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(aksi, filename): filename for filename in filenames}
+        for selesai, future in enumerate(as_completed(futures), 1):
+            filename = futures[future]
+            ok = future.result()
+            berhasil = berhasil and ok
+            if ok and os.path.exists(filename):
+                total_bytes += os.path.getsize(filename)
+            durasi = time.perf_counter() - mulai
+            print(f"[{selesai}/{len(filenames)}] {filename}: {'OK' if ok else 'Gagal'}"
+                  f" - {total_bytes / 1e6:.1f} MB, {total_bytes / 1e6 / durasi:.1f} MB/s")
+    return berhasil
+
+
 if __name__=='__main__':
     server_address=('127.0.0.1',6969)
     while True:
@@ -100,8 +485,16 @@ if __name__=='__main__':
         print("2. GET")
         print("3. UPLOAD")
         print("4. DELETE")
-        print("5. EXIT")
-        pilihan = input("Pilih menu [1-5]: ").strip()
+        print("5. MGET")
+        print("6. MPUT")
+        print("7. PARALLEL GET")
+        print("8. PARALLEL UPLOAD")
+        print("9. STAT")
+        print("10. RESUME GET")
+        print("11. RESUME UPLOAD")
+        print("12. PARALLEL RANGE GET")
+        print("13. EXIT")
+        pilihan = input("Pilih menu [1-13]: ").strip()
         if pilihan == '1':
             remote_list()
         elif pilihan == '2':
@@ -114,7 +507,33 @@ if __name__=='__main__':
             filename = input("Masukkan nama file yang ingin dihapus di server: ").strip()
             remote_delete(filename)
         elif pilihan == '5':
+            filenames = input("Masukkan nama-nama file yang ingin diunduh (pisahkan dengan spasi): ").split()
+            remote_mget(filenames)
+        elif pilihan == '6':
+            filenames = input("Masukkan nama-nama file lokal yang ingin diupload (pisahkan dengan spasi): ").split()
+            remote_mput(filenames)
+        elif pilihan == '7':
+            filenames = input("Masukkan nama-nama file yang ingin diunduh (pisahkan dengan spasi): ").split()
+            remote_parallel(remote_get, filenames)
+        elif pilihan == '8':
+            filenames = input("Masukkan nama-nama file lokal yang ingin diupload (pisahkan dengan spasi): ").split()
+            remote_parallel(remote_upload, filenames)
+        elif pilihan == '9':
+            filename = input("Masukkan nama file di server: ").strip()
+            size = remote_stat(filename)
+            print("Gagal" if size is None else f"{filename}: {size} bytes")
+        elif pilihan == '10':
+            filename = input("Masukkan nama file yang ingin dilanjutkan download-nya: ").strip()
+            remote_resume_get(filename)
+        elif pilihan == '11':
+            filename = input("Masukkan nama file lokal yang ingin dilanjutkan upload-nya: ").strip()
+            remote_resume_upload(filename)
+        elif pilihan == '12':
+            filename = input("Masukkan nama file yang ingin diunduh: ").strip()
+            remote_range_get(filename)
+        elif pilihan == '13':
             print("Keluar.")
+            close_connection()
             break
         else:
             print("Pilihan tidak valid.")
\ No newline at end of file
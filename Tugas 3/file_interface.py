@@ -1,16 +1,206 @@
 import os
 import json
 import base64
-from glob import glob
+import bisect
+import hashlib
+import re
+import tempfile
+import threading
+
+# ukuran chunk untuk transfer file, memori per transfer tidak tergantung ukuran file
+CHUNK_SIZE = 64*1024
+# nama isi file pada penyimpanan dedup: sha256 dalam hex
+DIGEST = re.compile(r'[0-9a-f]{64}')
+
+
+def read_chunks(fp,length=None,chunk_size=CHUNK_SIZE):
+    # generator: baca file per chunk (maksimal length bytes), file ditutup setelah selesai
+    # jika length diisi dan file lebih pendek (berubah saat dibaca) IOError di-raise,
+    # server lalu memutus koneksi karena panjang yang sudah diumumkan tidak terpenuhi
+    try:
+        while length is None or length > 0:
+            n = chunk_size if length is None else min(chunk_size,length)
+            chunk = fp.read(n)
+            if not chunk:
+                if length is not None:
+                    raise IOError(f'File {fp.name} berubah saat dibaca, kurang {length} bytes')
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+    finally:
+        fp.close()
+
+
+def b64encode_chunks(chunks):
+    # encoder base64 streaming: sisa bytes yang bukan kelipatan 3 disimpan untuk chunk berikutnya
+    sisa = b''
+    for chunk in chunks:
+        data = sisa + chunk if sisa else chunk
+        n = len(data) - len(data) % 3
+        sisa = data[n:]
+        if n:
+            yield base64.b64encode(data[:n])
+    if sisa:
+        yield base64.b64encode(sisa)
+
+
+def b64decode_chunks(chunks):
+    # decoder base64 streaming: sisa karakter yang bukan kelipatan 4 disimpan untuk chunk berikutnya
+    sisa = b''
+    for chunk in chunks:
+        if isinstance(chunk,str):
+            chunk = chunk.encode()
+        data = sisa + chunk if sisa else chunk
+        n = len(data) - len(data) % 4
+        sisa = bytes(data[n:])
+        if n:
+            yield base64.b64decode(data[:n])
+    if sisa:
+        yield base64.b64decode(sisa)
 
 
 class FileInterface:
-    def __init__(self):
+    def __init__(self,dedup=False):
         os.chdir('files/')
+        # dedup: isi file disimpan sekali di .store/<sha256>, nama file menjadi
+        # hard link ke isi tersebut; jumlah referensi = jumlah link - 1
+        self.dedup = dedup
+        self.store_dir = '.store'
+        self.store_lock = threading.Lock()
+        # file sementara upload dibuat di direktori tersembunyi sendiri, sehingga
+        # direktori files/ hanya berubah sekali (saat rename) per upload, lihat index_update
+        self.tmp_dir = '.tmp'
+        os.makedirs(self.tmp_dir,exist_ok=True)
+        # (st_dev, st_ino) -> digest, untuk mencari isi file dari sebuah nama
+        self.blobs = {}
+        if dedup:
+            os.makedirs(self.store_dir,exist_ok=True)
+            with os.scandir(self.store_dir) as it:
+                for entry in it:
+                    if DIGEST.fullmatch(entry.name):
+                        st = entry.stat()
+                        self.blobs[(st.st_dev,st.st_ino)] = entry.name
+        # index direktori di memori: nama -> (size, mtime), plus daftar nama terurut
+        # untuk filter prefix; di-scan ulang hanya jika mtime direktori berubah
+        self.index = {}
+        self.index_names = []
+        self.index_mtime = None
+        self.index_lock = threading.Lock()
+
+    def dir_mtime(self):
+        return os.stat('.').st_mtime_ns
+
+    def refresh_index(self):
+        # dipanggil dengan index_lock
+        mtime = self.dir_mtime()
+        if mtime == self.index_mtime:
+            return
+        index = {}
+        with os.scandir('.') as it:
+            for entry in it:
+                # file tersembunyi (termasuk file sementara upload) tidak ikut di-list
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
+                st = entry.stat()
+                index[entry.name] = (st.st_size, st.st_mtime)
+        self.index = index
+        self.index_names = sorted(index)
+        self.index_mtime = mtime
+
+    def index_update(self,filename,mtime_awal):
+        # update satu entry setelah UPLOAD/DELETE tanpa scan ulang direktori
+        # mtime_awal: mtime direktori tepat sebelum satu rename/remove yang mengubah
+        # direktori. update di tempat hanya jika index sesuai kondisi sebelum operasi
+        # dan mtime bergeser (sekali, oleh operasi itu); selain itu ada perubahan lain
+        # (misal dari luar server) atau perubahan tidak terlihat di mtime: scan ulang
+        if os.path.dirname(filename) or filename.startswith('.'):
+            return
+        with self.index_lock:
+            if self.index_mtime is None:
+                # index belum pernah dibuat, LIST berikutnya akan scan direktori
+                return
+            mtime = self.dir_mtime()
+            if self.index_mtime != mtime_awal or mtime == mtime_awal:
+                self.index_mtime = None
+                self.refresh_index()
+                return
+            try:
+                st = os.stat(filename)
+                entry = (st.st_size, st.st_mtime)
+            except FileNotFoundError:
+                entry = None
+            if entry is None:
+                if self.index.pop(filename, None) is not None:
+                    self.index_names.remove(filename)
+            else:
+                if filename not in self.index:
+                    bisect.insort(self.index_names, filename)
+                self.index[filename] = entry
+            self.index_mtime = mtime
+
+    def blob_path(self,digest):
+        return os.path.join(self.store_dir,digest)
+
+    def store_put(self,tmpname,digest,filename):
+        # simpan isi file sekali saja, lalu buat filename sebagai referensi ke isi tersebut
+        with self.store_lock:
+            blob = self.blob_path(digest)
+            if os.path.exists(blob):
+                os.remove(tmpname)
+            else:
+                os.replace(tmpname,blob)
+                st = os.stat(blob)
+                self.blobs[(st.st_dev,st.st_ino)] = digest
+            self.store_link(blob,filename)
+
+    def store_link(self,blob,filename):
+        # dipanggil dengan store_lock
+        try:
+            lama = os.stat(filename)
+        except FileNotFoundError:
+            lama = None
+        st = os.stat(blob)
+        if lama and (lama.st_dev,lama.st_ino) == (st.st_dev,st.st_ino):
+            return
+        # link dibuat dengan nama sementara (di .store, agar direktori tujuan hanya
+        # berubah sekali) lalu di-rename agar penggantian file lama atomik
+        linkname = os.path.join(self.store_dir,f'.link-{os.getpid()}-{threading.get_ident()}')
+        os.link(blob,linkname)
+        os.replace(linkname,filename)
+        if lama:
+            self.store_release(lama)
+
+    def store_release(self,st):
+        # dipanggil dengan store_lock setelah sebuah referensi dihapus,
+        # isi file ikut dihapus jika tidak ada nama lain yang memakainya
+        digest = self.blobs.get((st.st_dev,st.st_ino))
+        if digest is None:
+            return
+        blob = self.blob_path(digest)
+        if os.stat(blob).st_nlink <= 1:
+            os.remove(blob)
+            del self.blobs[(st.st_dev,st.st_ino)]
 
     def list(self,params=[]):
+        # LIST [prefix] [-l]
+        # -l: setiap file dikembalikan beserta size dan mtime
         try:
-            filelist = glob('*.*')
+            detail = '-l' in params
+            prefix = next((p for p in params if p != '-l'), '')
+            filelist = []
+            with self.index_lock:
+                self.refresh_index()
+                names = self.index_names
+                i = bisect.bisect_left(names, prefix)
+                while i < len(names) and names[i].startswith(prefix):
+                    nama = names[i]
+                    if detail:
+                        size, mtime = self.index[nama]
+                        filelist.append(dict(name=nama,size=size,mtime=mtime))
+                    else:
+                        filelist.append(nama)
+                    i += 1
             return dict(status='OK',data=filelist)
         except Exception as e:
             return dict(status='ERROR',data=str(e))
@@ -21,28 +211,197 @@ class FileInterface:
             if (filename == ''):
                 return None
             fp = open(f"{filename}",'rb')
-            isifile = base64.b64encode(fp.read()).decode()
+            isifile = b''.join(b64encode_chunks(read_chunks(fp))).decode()
             return dict(status='OK',data_namafile=filename,data_file=isifile)
         except Exception as e:
             return dict(status='ERROR',data=str(e))
 
+    def get_raw(self,params=[]):
+        # versi streaming dari get: data_file berupa generator chunk bytes mentah
+        # GET nama [offset] [length]: hanya bagian file mulai offset sepanjang length
+        # data_size = panjang bagian yang dikirim, file_size = ukuran file seluruhnya,
+        # mtime dipakai client untuk memastikan resume download masih file yang sama
+        try:
+            filename = params[0]
+            if (filename == ''):
+                return None
+            offset = int(params[1]) if len(params) > 1 else 0
+            fp = open(f"{filename}",'rb')
+            st = os.fstat(fp.fileno())
+            size = st.st_size
+            length = size - offset
+            if len(params) > 2:
+                length = min(int(params[2]),length)
+            if offset < 0 or offset > size or length < 0:
+                fp.close()
+                return dict(status='ERROR',data=f'range {offset} {length} di luar ukuran file {size}')
+            fp.seek(offset)
+            return dict(status='OK',data_namafile=filename,data_offset=offset,data_size=length,
+                        file_size=size,mtime=st.st_mtime,data_file=read_chunks(fp,length))
+        except Exception as e:
+            return dict(status='ERROR',data=str(e))
+
+    def stat(self,params=[]):
+        # STAT nama: ukuran file saat ini, dipakai client untuk melanjutkan transfer
+        try:
+            filename = params[0]
+            st = os.stat(filename)
+            return dict(status='OK',data_namafile=filename,data_size=st.st_size,mtime=st.st_mtime)
+        except Exception as e:
+            return dict(status='ERROR',data=str(e))
+
+    def read_file(self,filename,size):
+        # generator isi file sepanjang size, file baru dibuka saat mulai dibaca
+        # sehingga MGET banyak file tidak membuka semua file sekaligus
+        yield from read_chunks(open(filename,'rb'),size)
+
+    def mget(self,params=[]):
+        # MGET nama1 nama2 ...: status per file, data_file berupa generator chunk
+        hasil = []
+        for filename in params:
+            try:
+                size = os.stat(filename).st_size
+                hasil.append(dict(status='OK',data_namafile=filename,data_size=size,data_file=self.read_file(filename,size)))
+            except Exception as e:
+                hasil.append(dict(status='ERROR',data_namafile=filename,data=str(e)))
+        return dict(status='OK',data=hasil)
+
     def upload(self,params=[]):
         try:
             filename = params[0]
             filedata_b64 = params[1]
-            filedata = base64.b64decode(filedata_b64)
-            with open(filename, 'wb') as f:
-                f.write(filedata)
+            # decode base64 per potongan, tidak membuat salinan penuh hasil decode
+            n = CHUNK_SIZE//3*4
+            potongan = (filedata_b64[i:i+n] for i in range(0,len(filedata_b64),n))
+            # UPLOAD nama isi [offset]
+            return self.upload_raw([filename,*params[2:]],b64decode_chunks(potongan))
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def upload_raw(self,params=[],chunks=()):
+        # versi streaming dari upload: chunks berupa iterable bytes mentah
+        # ditulis ke file sementara lalu di-rename agar upload yang terputus tidak merusak file lama
+        try:
+            filename = params[0]
+            if len(params) > 1:
+                return self.upload_at(filename,int(params[1]),chunks)
+            tmpdir = self.store_dir if self.dedup else self.tmp_dir
+            fd, tmpname = tempfile.mkstemp(prefix='.upload-',dir=tmpdir)
+            # pada mode dedup isi file di-hash sambil ditulis, tanpa membaca ulang file
+            hasher = hashlib.sha256()
+            try:
+                with os.fdopen(fd,'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+                        if self.dedup:
+                            hasher.update(chunk)
+                os.chmod(tmpname,0o644)
+                mtime_awal = self.dir_mtime()
+                if self.dedup:
+                    self.store_put(tmpname,hasher.hexdigest(),filename)
+                else:
+                    os.replace(tmpname,filename)
+            except BaseException:
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+                raise
+            self.index_update(filename,mtime_awal)
             return dict(status='OK', data=f'File {filename} berhasil diupload')
         except Exception as e:
             return dict(status='ERROR', data=str(e))
 
+    def upload_at(self,filename,offset,chunks):
+        # UPLOAD dengan offset: offset bytes pertama file lama disalin ke file sementara,
+        # isi baru ditulis setelahnya lalu file sementara di-rename menggantikan file lama,
+        # sehingga GET yang sedang berjalan tetap membaca file lama secara utuh.
+        # jika upload terputus bagian yang sudah diterima tetap di-rename dan bisa dilanjutkan
+        # (cek ukurannya dengan STAT lalu UPLOAD lagi mulai ukuran tersebut)
+        try:
+            size = os.stat(filename).st_size
+        except FileNotFoundError:
+            size = 0
+        if offset < 0 or offset > size:
+            return dict(status='ERROR', data=f'offset {offset} di luar ukuran file {size}')
+        fd, tmpname = tempfile.mkstemp(prefix='.upload-',dir=self.tmp_dir)
+        tersalin = False
+        try:
+            with os.fdopen(fd,'wb') as f:
+                if offset:
+                    for chunk in read_chunks(open(filename,'rb'),offset):
+                        f.write(chunk)
+                tersalin = True
+                for chunk in chunks:
+                    f.write(chunk)
+        finally:
+            if tersalin:
+                os.chmod(tmpname,0o644)
+                # pada mode dedup file lama bisa berupa link ke isi di .store,
+                # referensinya dilepas setelah nama file diganti
+                with self.store_lock:
+                    try:
+                        lama = os.stat(filename)
+                    except FileNotFoundError:
+                        lama = None
+                    mtime_awal = self.dir_mtime()
+                    os.replace(tmpname,filename)
+                    if lama:
+                        self.store_release(lama)
+                self.index_update(filename,mtime_awal)
+            else:
+                os.remove(tmpname)
+        return dict(status='OK', data=f'File {filename} berhasil diupload mulai offset {offset}')
+
+    def mput(self,params=[]):
+        # MPUT nama1 isi1_base64 nama2 isi2_base64 ...
+        hasil = []
+        for filename, filedata_b64 in zip(params[0::2],params[1::2]):
+            cl = self.upload([filename,filedata_b64])
+            hasil.append(dict(data_namafile=filename,**cl))
+        return dict(status='OK',data=hasil)
+
+    def mput_raw(self,params=[],parts=()):
+        # versi streaming dari mput: parts berupa iterable chunk untuk setiap file, urut sesuai params
+        hasil = []
+        for filename, part in zip(params,parts):
+            cl = self.upload_raw([filename],part)
+            # habiskan sisa isi file yang gagal ditulis agar file berikutnya tetap sinkron
+            for _ in part:
+                pass
+            hasil.append(dict(data_namafile=filename,**cl))
+        return dict(status='OK',data=hasil)
+
+    def link(self,params=[]):
+        # LINK nama_file sha256: "upload if absent", nama file dibuat dari isi yang
+        # sudah ada di server sehingga client tidak perlu mengirim isi file lagi
+        try:
+            filename = params[0]
+            digest = params[1].lower()
+            if not self.dedup:
+                return dict(status='ERROR', data='penyimpanan dedup tidak aktif')
+            if not DIGEST.fullmatch(digest):
+                return dict(status='ERROR', data=f'digest {digest} tidak valid')
+            mtime_awal = self.dir_mtime()
+            with self.store_lock:
+                blob = self.blob_path(digest)
+                if not os.path.exists(blob):
+                    return dict(status='ERROR', data=f'isi file {digest} belum ada di server')
+                self.store_link(blob,filename)
+            self.index_update(filename,mtime_awal)
+            return dict(status='OK', data=f'File {filename} berhasil diupload (isi sudah ada di server)')
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
     def delete(self,params=[]):
         try:
             filename = params[0]
             if not os.path.exists(filename):
                 return dict(status='ERROR', data=f'File {filename} tidak ditemukan')
-            os.remove(filename)
+            with self.store_lock:
+                st = os.stat(filename)
+                mtime_awal = self.dir_mtime()
+                os.remove(filename)
+                self.store_release(st)
+            self.index_update(filename,mtime_awal)
             return dict(status='OK', data=f'File {filename} berhasil dihapus')
         except Exception as e:
             return dict(status='ERROR', data=str(e))
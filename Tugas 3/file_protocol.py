@@ -1,8 +1,12 @@
 import json
 import logging
-import shlex
+import re
+import struct
+import zlib
+from collections.abc import Iterator
+from itertools import chain
 
-from file_interface import FileInterface
+from file_interface import FileInterface, CHUNK_SIZE, b64encode_chunks
 
 """
 * class FileProtocol bertugas untuk memproses 
@@ -14,25 +18,339 @@ pada akhirnya akan diproses dalam bentuk string
 
 * class FileProtocol akan memproses data yang masuk dalam bentuk
 string
+
+* request dan response protokol teks diakhiri "\r\n\r\n", sehingga satu
+  koneksi bisa dipakai untuk banyak request berurutan
+
+* protokol v2 (lihat PROTOKOL.txt) memakai frame biner:
+  [magic 'FPv2'][panjang header 4 byte][panjang payload 8 byte][header JSON][payload]
+  header berupa JSON kecil, payload berupa bytes mentah tanpa base64
+
+* GET/UPLOAD v2 bisa dikompres dengan deflate (zlib), panjang hasil kompresi
+  tidak diketahui di awal sehingga payload dikirim per blok (lihat CHUNKED)
 """
 
+# satu token: "teks dalam kutip", 'teks dalam kutip', atau kata tanpa spasi
+TOKEN = re.compile(rb'''\s*(?:"([^"]*)"|'([^']*)'|(\S+))''')
+# request yang parameter ganjilnya (index 1, 3, ...) berupa isi file
+PAYLOAD_REQUESTS = ('upload','mput')
+
+# akhir request dan response pada protokol teks
+TERMINATOR = b'\r\n\r\n'
+
+MAGIC_V2 = b'FPv2'
+FRAME_V2 = struct.Struct('!4sIQ')
+
+# panjang payload khusus: payload dikirim per blok [panjang 4 byte][isi blok]
+# dan diakhiri blok dengan panjang 0
+CHUNKED = 2**64 - 1
+BLOCK = struct.Struct('!I')
+
+# file yang isinya sudah terkompresi, tidak dikompres lagi
+COMPRESSED_TYPES = ('.jpg','.jpeg','.png','.gif','.webp','.zip','.gz','.bz2','.xz','.7z','.rar','.mp3','.mp4')
+
+
+def pack_frame(header, payload_length=0):
+    # membuat bagian depan frame v2, payload dikirim terpisah agar tidak dicopy
+    header_bytes = json.dumps(header).encode()
+    return FRAME_V2.pack(MAGIC_V2, len(header_bytes), payload_length) + header_bytes
+
+
+def parse_command(data):
+    """
+    pengganti shlex.split: memecah request menjadi token dalam waktu linear
+    (regex berjalan di C, bukan per karakter di Python)
+    return list token berupa memoryview ke data asli, isi file yang besar
+    tidak pernah disalin
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    view = memoryview(data)
+    tokens = []
+    pos = 0
+    while True:
+        m = TOKEN.match(data, pos)
+        if m is None:
+            break
+        group = m.lastindex
+        tokens.append(view[m.start(group):m.end(group)])
+        pos = m.end()
+    return tokens
+
+
+def describe_params(params):
+    # untuk logging: isi file hanya ditampilkan ukurannya
+    return ' '.join(f"<{len(p)} bytes>" if isinstance(p, (bytes, memoryview)) else str(p) for p in params)
+
+
+def json_stream(obj):
+    # seperti json.dumps tetapi hasilnya generator bytes; nilai berupa iterator
+    # chunk bytes (isi file) di-encode base64 sambil dikirim
+    if isinstance(obj, dict):
+        yield b'{'
+        for i, (k, v) in enumerate(obj.items()):
+            yield ((', ' if i else '') + json.dumps(k) + ': ').encode()
+            yield from json_stream(v)
+        yield b'}'
+    elif isinstance(obj, list):
+        yield b'['
+        for i, v in enumerate(obj):
+            if i:
+                yield b', '
+            yield from json_stream(v)
+        yield b']'
+    elif isinstance(obj, Iterator):
+        yield b'"'
+        yield from b64encode_chunks(obj)
+        yield b'"'
+    else:
+        yield json.dumps(obj).encode()
+
+
+def should_compress(filename):
+    return not filename.lower().endswith(COMPRESSED_TYPES)
+
+
+def deflate_chunks(chunks, level=6, stats=None):
+    # kompres aliran chunk, stats (dict) diisi jumlah bytes raw dan compressed
+    compressor = zlib.compressobj(level)
+    raw = compressed = 0
+    for chunk in chunks:
+        raw += len(chunk)
+        out = compressor.compress(chunk)
+        if out:
+            compressed += len(out)
+            yield out
+    out = compressor.flush()
+    compressed += len(out)
+    yield out
+    logging.warning(f"deflate: {raw} -> {compressed} bytes")
+    if stats is not None:
+        stats.update(raw=raw, compressed=compressed)
+
+
+def inflate_chunks(chunks, stats=None):
+    # kebalikan deflate_chunks, memori tetap kecil walaupun file besar
+    decompressor = zlib.decompressobj()
+    raw = compressed = 0
+    for chunk in chunks:
+        compressed += len(chunk)
+        out = decompressor.decompress(chunk)
+        if out:
+            raw += len(out)
+            yield out
+    out = decompressor.flush()
+    if not decompressor.eof:
+        raise ValueError("data deflate tidak lengkap")
+    if out:
+        raw += len(out)
+        yield out
+    if stats is not None:
+        stats.update(raw=raw, compressed=compressed)
+
+
+def block_chunks(chunks):
+    # bungkus aliran chunk menjadi payload CHUNKED
+    for chunk in chunks:
+        if chunk:
+            yield BLOCK.pack(len(chunk)) + chunk
+    yield BLOCK.pack(0)
+
+
+def split_chunks(chunks, sizes):
+    # pecah satu aliran chunk menjadi beberapa generator berurutan sesuai sizes,
+    # setiap generator harus dihabiskan sebelum generator berikutnya dipakai
+    it = iter(chunks)
+    sisa = memoryview(b'')
+
+    def bagian(n):
+        nonlocal sisa
+        while n > 0:
+            if not sisa:
+                sisa = memoryview(next(it, b''))
+                if not sisa:
+                    raise ConnectionError(f"payload kurang {n} bytes")
+            chunk, sisa = sisa[:n], sisa[n:]
+            n -= len(chunk)
+            yield chunk
+
+    for size in sizes:
+        yield bagian(size)
+
+
+class SocketReader:
+    """
+    buffer baca di atas socket, dipakai oleh server dan client
+    untuk membaca frame v2 dengan panjang yang pasti
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+
+    def fill(self, size=65536):
+        data = self.sock.recv(size)
+        if not data:
+            return False
+        self.buffer += data
+        return True
+
+    def is_v2(self):
+        # cek magic di awal buffer, baca lagi jika baru sebagian magic yang datang
+        while len(self.buffer) < len(MAGIC_V2) and MAGIC_V2.startswith(self.buffer):
+            if not self.fill():
+                return False
+        return self.buffer.startswith(MAGIC_V2)
+
+    def take_all(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+    def read_until(self, terminator=TERMINATOR):
+        # return data sebelum terminator, terminator dibuang dan sisa buffer disimpan
+        # jika koneksi ditutup sebelum terminator datang, sisa buffer dianggap request terakhir
+        start = 0
+        while True:
+            idx = self.buffer.find(terminator, start)
+            if idx >= 0:
+                data = bytes(self.buffer[:idx])
+                del self.buffer[:idx + len(terminator)]
+                return data
+            # terminator bisa terpotong di antara dua recv
+            start = max(0, len(self.buffer) - len(terminator) + 1)
+            if not self.fill():
+                return self.take_all() or None
+
+    def read_exact(self, n):
+        # payload dialokasikan sekali lalu diisi langsung dengan recv_into
+        result = bytearray(n)
+        view = memoryview(result)
+        have = min(n, len(self.buffer))
+        view[:have] = self.buffer[:have]
+        del self.buffer[:have]
+        while have < n:
+            got = self.sock.recv_into(view[have:])
+            if not got:
+                raise ConnectionError(f"koneksi terputus, diterima {have}/{n} bytes")
+            have += got
+        return result
+
+    def iter_exact(self, n, chunk_size=CHUNK_SIZE):
+        # generator: n bytes berikutnya per chunk, tanpa menampung semuanya di memori
+        while n > 0:
+            if self.buffer:
+                chunk = bytes(self.buffer[:n])
+                del self.buffer[:len(chunk)]
+            else:
+                chunk = self.sock.recv(min(n, chunk_size))
+                if not chunk:
+                    raise ConnectionError(f"koneksi terputus, kurang {n} bytes")
+            n -= len(chunk)
+            yield chunk
+
+    def iter_blocks(self):
+        # generator isi payload CHUNKED, berhenti setelah blok dengan panjang 0
+        while True:
+            (n,) = BLOCK.unpack(self.read_exact(BLOCK.size))
+            if not n:
+                return
+            yield from self.iter_exact(n)
+
+    def iter_payload(self, n):
+        if n == CHUNKED:
+            return self.iter_blocks()
+        return self.iter_exact(n)
+
+    def read_header(self):
+        # return (header dict, panjang payload), payload dibaca terpisah
+        # status dari server yang berupa JSON teks (misal BUSY) juga diterima sebagai header
+        if not self.buffer and not self.fill():
+            raise ConnectionError("koneksi ditutup server")
+        if self.buffer.startswith(b'{'):
+            return json.loads(self.read_until(TERMINATOR)), 0
+        magic, header_length, payload_length = FRAME_V2.unpack(self.read_exact(FRAME_V2.size))
+        if magic != MAGIC_V2:
+            raise ValueError("frame v2 tidak valid")
+        header = json.loads(self.read_exact(header_length))
+        return header, payload_length
+
+    def read_frame(self):
+        # return (header dict, payload bytearray)
+        header, payload_length = self.read_header()
+        return header, self.read_exact(payload_length)
+
 
 
 class FileProtocol:
-    def __init__(self):
-        self.file = FileInterface()
+    def __init__(self,dedup=False):
+        self.file = FileInterface(dedup=dedup)
+        # request yang boleh dipanggil client, method FileInterface lain (helper
+        # internal seperti upload_raw, store_put, index_update) tidak bisa diakses
+        f = self.file
+        self.commands = dict(list=f.list,get=f.get_raw,stat=f.stat,mget=f.mget,
+                             upload=f.upload,mput=f.mput,link=f.link,delete=f.delete)
+        # protokol v2: upload/mput menerima payload bytes mentah (lihat proses_frame)
+        self.commands_v2 = dict(self.commands,upload=f.upload_raw,mput=f.mput_raw)
     def proses_string(self,string_datamasuk=''):
-        logging.warning(f"string diproses: {string_datamasuk}")
-        # Jangan pakai .lower() agar base64 tidak rusak
-        c = shlex.split(string_datamasuk)
+        return b''.join(self.proses_stream(string_datamasuk)).decode()
+
+    def proses_stream(self,string_datamasuk=''):
+        # generator bytes hasil JSON, isi file GET di-encode base64 per chunk
+        # sehingga response besar tidak pernah ditampung utuh di memori
+        # string_datamasuk boleh berupa str atau bytes
+        try:
+            c = parse_command(string_datamasuk)
+            c_request = c[0].tobytes().decode().strip().lower()  # hanya request yang di-lower
+            params = []
+            for i, x in enumerate(c[1:]):
+                if c_request in PAYLOAD_REQUESTS and i % 2 == 1:
+                    # isi file (base64) diteruskan sebagai memoryview, tidak di-decode
+                    params.append(x)
+                else:
+                    params.append(x.tobytes().decode())
+            logging.warning(f"memproses request: {c_request} {describe_params(params)}")
+            cl = self.commands[c_request](params)
+        except Exception:
+            cl = dict(status='ERROR',data='request tidak dikenali')
+        yield from json_stream(cl)
+
+    def proses_frame(self,header,payload=()):
+        # protokol v2: payload berupa iterable chunk bytes
+        # return (header dict, panjang payload, iterable chunk payload) untuk dikirim balik
         try:
-            c_request = c[0].strip().lower()  # hanya request yang di-lower
-            logging.warning(f"memproses request: {c_request}")
-            params = [x for x in c[1:]]
-            cl = getattr(self.file,c_request)(params)
-            return json.dumps(cl)
+            c_request = header['request'].strip().lower()
+            params = list(header.get('params',[]))
+            logging.warning(f"memproses request v2: {c_request} {describe_params(params)}")
+            command = self.commands_v2[c_request]
+            if header.get('encoding') == 'deflate':
+                payload = inflate_chunks(payload)
+            if c_request == 'get':
+                cl = command(params)
+                level = int(header.get('compress') or 0)
+                if level and 'data_file' in cl and should_compress(params[0]):
+                    # client minta dikompres: panjang hasil belum diketahui, kirim per blok
+                    cl['encoding'] = 'deflate'
+                    data = deflate_chunks(cl.pop('data_file'), min(level,9))
+                    return cl, CHUNKED, block_chunks(data)
+            elif c_request == 'upload':
+                cl = command(params,payload)
+            elif c_request == 'mput':
+                # payload berisi isi semua file berurutan, panjang masing-masing di header sizes
+                cl = command(params,split_chunks(payload,header['sizes']))
+            else:
+                cl = command(params)
+            if cl is None:
+                cl = dict(status='ERROR',data='parameter tidak valid')
+            if 'data_file' in cl:
+                return cl, cl['data_size'], cl.pop('data_file')
+            if c_request == 'mget':
+                # isi semua file yang berhasil digabung menjadi satu payload, urut sesuai data
+                files = [x for x in cl['data'] if 'data_file' in x]
+                payloads = [x.pop('data_file') for x in files]
+                return cl, sum(x['data_size'] for x in files), chain.from_iterable(payloads)
+            return cl, 0, ()
         except Exception:
-            return json.dumps(dict(status='ERROR',data='request tidak dikenali'))
+            return dict(status='ERROR',data='request tidak dikenali'), 0, ()
 
 
 if __name__=='__main__':
@@ -4,10 +4,18 @@ import threading
 import logging
 import time
 import sys
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
 
 
-from file_protocol import  FileProtocol
-fp = FileProtocol()
+from file_protocol import  FileProtocol, SocketReader, pack_frame, TERMINATOR
+from file_interface import CHUNK_SIZE
+# potongan response lebih kecil dari ini (header, potongan JSON) digabung dulu,
+# yang lebih besar (isi file) dikirim langsung tanpa disalin
+GABUNG_MAKS = 16*1024
+# FILE_SERVER_DEDUP=1: file dengan isi yang sama hanya disimpan sekali
+fp = FileProtocol(dedup=os.getenv("FILE_SERVER_DEDUP") == "1")
 
 
 class ProcessTheClient(threading.Thread):
@@ -17,22 +25,80 @@ class ProcessTheClient(threading.Thread):
         threading.Thread.__init__(self)
 
     def run(self):
-        while True:
-            data = self.connection.recv(1024)
-            if data:
-                d = data.decode()
-                hasil = fp.proses_string(d)
-                hasil=hasil+"\r\n\r\n"
-                self.connection.sendall(hasil.encode())
-            else:
-                break
+        # koneksi tetap dibuka untuk request berikutnya sampai client menutupnya
+        reader = SocketReader(self.connection)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                if not reader.buffer and not reader.fill():
+                    break
+                if reader.is_v2():
+                    # protokol v2: header JSON + payload bytes mentah,
+                    # payload di-stream per chunk antara socket dan disk
+                    header, panjang = reader.read_header()
+                    payload = reader.iter_payload(panjang)
+                    hasil, panjang_balik, payload_balik = fp.proses_frame(header, payload)
+                    # buang sisa payload yang tidak dipakai agar frame berikutnya tetap sinkron
+                    for _ in payload:
+                        pass
+                    self.kirim([pack_frame(hasil, panjang_balik)], payload_balik)
+                else:
+                    # protokol teks: kumpulkan bytes sampai request lengkap (diakhiri \r\n\r\n)
+                    d = reader.read_until(TERMINATOR)
+                    if d is None:
+                        break
+                    self.kirim(fp.proses_stream(d), [TERMINATOR])
+        except (OSError, ValueError) as e:
+            logging.warning(f"koneksi {self.address} error: {e}")
         self.connection.close()
 
+    def kirim(self, *bagian):
+        # potongan kecil digabung sampai CHUNK_SIZE agar satu response tidak
+        # terpecah menjadi banyak segmen TCP kecil; chunk besar tidak disalin ke
+        # buffer tetapi dikirim bersama isi buffer dengan satu sendmsg (writev)
+        buf = bytearray()
+        for chunks in bagian:
+            for chunk in chunks:
+                if len(chunk) >= GABUNG_MAKS:
+                    self.sendall_msg(buf, chunk)
+                    buf = bytearray()
+                    continue
+                buf += chunk
+                if len(buf) >= CHUNK_SIZE:
+                    self.connection.sendall(buf)
+                    buf.clear()
+        if buf:
+            self.connection.sendall(buf)
+
+    def sendall_msg(self, *buffers):
+        # seperti sendall untuk beberapa buffer sekaligus, tanpa menggabungkannya
+        views = [memoryview(b) for b in buffers if len(b)]
+        while views:
+            sent = self.connection.sendmsg(views)
+            while sent:
+                if sent >= len(views[0]):
+                    sent -= len(views.pop(0))
+                else:
+                    views[0] = views[0][sent:]
+                    sent = 0
+
 
 class Server(threading.Thread):
-    def __init__(self,ipaddress='0.0.0.0',port=8889):
+    def __init__(self,ipaddress='0.0.0.0',port=8889,pool_size=None,queue_depth=0,backlog=128,
+                 idle_timeout=30,reap_interval=5):
+        # pool_size None: satu thread baru per koneksi (mode lama)
+        # pool_size N: maksimal N koneksi dilayani bersamaan oleh worker pool,
+        #   queue_depth koneksi lain boleh menunggu, sisanya ditolak dengan status BUSY
         self.ipinfo=(ipaddress,port)
         self.the_clients = []
+        self.pool_size = pool_size
+        self.queue_depth = queue_depth
+        self.backlog = backlog
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        if pool_size:
+            # slot = worker yang sedang melayani + koneksi yang menunggu di antrian
+            self.slots = threading.BoundedSemaphore(pool_size + queue_depth)
         self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         threading.Thread.__init__(self)
@@ -40,20 +106,70 @@ class Server(threading.Thread):
     def run(self):
         logging.warning(f"server berjalan di ip address {self.ipinfo}")
         self.my_socket.bind(self.ipinfo)
-        self.my_socket.listen(1)
+        self.my_socket.listen(self.backlog)
+        # accept diberi timeout agar reap tetap berjalan walaupun tidak ada koneksi baru
+        self.my_socket.settimeout(self.reap_interval)
+        executor = None
+        if self.pool_size:
+            logging.warning(f"worker pool: {self.pool_size} worker, antrian {self.queue_depth}")
+            executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        terakhir_reap = time.time()
         while True:
-            self.connection, self.client_address = self.my_socket.accept()
-            logging.warning(f"connection from {self.client_address}")
+            try:
+                self.connection, self.client_address = self.my_socket.accept()
+                logging.warning(f"connection from {self.client_address}")
+                if executor:
+                    self.submit(executor, self.connection, self.client_address)
+                else:
+                    clt = ProcessTheClient(self.connection, self.client_address)
+                    clt.start()
+                    self.the_clients.append(clt)
+            except socket.timeout:
+                pass
+            if time.time() - terakhir_reap >= self.reap_interval:
+                self.reap()
+                terakhir_reap = time.time()
+
+    def submit(self, executor, connection, address):
+        if not self.slots.acquire(blocking=False):
+            logging.warning(f"server sibuk, koneksi {address} ditolak")
+            self.tolak(connection)
+            return
+        # koneksi yang diam terlalu lama dilepas agar worker bisa dipakai client lain
+        connection.settimeout(self.idle_timeout)
+        clt = ProcessTheClient(connection, address)
+        future = executor.submit(clt.run)
+        future.add_done_callback(lambda f: self.slots.release())
+        self.the_clients.append(future)
+
+    def tolak(self, connection):
+        try:
+            hasil = json.dumps(dict(status='BUSY', data='server sibuk, coba lagi nanti'))
+            connection.sendall(hasil.encode() + TERMINATOR)
+        except OSError:
+            pass
+        connection.close()
 
-            clt = ProcessTheClient(self.connection, self.client_address)
-            clt.start()
-            self.the_clients.append(clt)
+    def reap(self):
+        # buang client yang sudah selesai agar the_clients tidak terus membesar
+        if self.pool_size:
+            self.the_clients = [f for f in self.the_clients if not f.done()]
+        else:
+            self.the_clients = [c for c in self.the_clients if c.is_alive()]
 
 
 def main():
-    svr = Server(ipaddress='0.0.0.0',port=6969)
+    # konfigurasi worker pool lewat environment variable, contoh:
+    # FILE_SERVER_POOL=20 FILE_SERVER_QUEUE=50 python file_server.py
+    pool_size = int(os.getenv("FILE_SERVER_POOL", 0)) or None
+    queue_depth = int(os.getenv("FILE_SERVER_QUEUE", 0))
+    backlog = int(os.getenv("FILE_SERVER_BACKLOG", 128))
+    svr = Server(ipaddress='0.0.0.0',port=6969,pool_size=pool_size,queue_depth=queue_depth,backlog=backlog)
     svr.start()
+    # main thread harus tetap hidup, ThreadPoolExecutor menolak task baru
+    # setelah main thread selesai (interpreter dianggap shutdown)
+    svr.join()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
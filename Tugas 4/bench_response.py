@@ -0,0 +1,78 @@
+import sys
+import time
+from datetime import datetime
+
+from http import HttpServer, HttpRequestParser
+
+"""
+benchmark pembuatan response HttpServer: cara lama (strftime + list baris header
+per response) vs fast path (Date di-cache per detik, prefix status yang sudah
+di-encode, response route konstan yang sudah jadi)
+
+cara pakai:
+  python bench_response.py [jumlah_iterasi]
+  default 200000 iterasi per pengukuran, hasil dalam response per detik (1 core)
+"""
+
+
+def response_prefix_lama(httpserver, kode, message, content_length):
+    # salinan response_prefix sebelum fast path, sebagai pembanding
+    tanggal = datetime.now().strftime('%c')
+    resp_lines = []
+    resp_lines.append(f"HTTP/1.1 {kode} {message}\r\n")
+    resp_lines.append(f"Date: {tanggal}\r\n")
+    resp_lines.append("Connection: keep-alive\r\n")
+    resp_lines.append(f"Keep-Alive: timeout={httpserver.keep_alive_timeout}, max={httpserver.max_keep_alive_requests}\r\n")
+    resp_lines.append("Server: myserver/1.0\r\n")
+    resp_lines.append(f"Content-Length: {content_length}\r\n")
+    return "".join(resp_lines).encode('utf-8')
+
+
+def santai_lama(httpserver):
+    # /santai cara lama: seluruh header dibuat ulang lalu digabung dengan body
+    body = b'santai saja'
+    return response_prefix_lama(httpserver, 200, 'OK', len(body)) + httpserver.header_lines({}) + body
+
+
+def ukur(fungsi, jumlah):
+    mulai = time.perf_counter()
+    for _ in range(jumlah):
+        fungsi()
+    return jumlah / (time.perf_counter() - mulai)
+
+
+def main():
+    jumlah = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    httpserver = HttpServer()
+
+    def keep_alive(fungsi):
+        # handle_request() mengembalikan local.keep_alive ke False setelah selesai,
+        # jadi flag diset di setiap panggilan: semua pengukuran membuat header
+        # keep-alive seperti cara lama (bukan "Connection: close" yang lebih pendek)
+        def jalankan():
+            httpserver.local.keep_alive = True
+            return fungsi()
+        return jalankan
+
+    santai = HttpRequestParser().feed(b"GET /santai HTTP/1.1\r\n\r\n")[0]
+    file_kecil = HttpRequestParser().feed(b"GET /testing.txt HTTP/1.1\r\n\r\n")[0]
+    httpserver.handle_request(file_kecil)  # isi cache dulu
+
+    pengukuran = [
+        ('header lama', keep_alive(lambda: response_prefix_lama(httpserver, 200, 'OK', 11)), None),
+        ('header baru', keep_alive(lambda: httpserver.response_prefix(200, 'OK', 11)), 'header lama'),
+        ('/santai lama', keep_alive(lambda: santai_lama(httpserver)), None),
+        ('/santai baru', keep_alive(lambda: httpserver.http_get('/santai', {})), '/santai lama'),
+        ('handle /santai', keep_alive(lambda: httpserver.handle_request(santai)), None),
+        ('handle file cache', keep_alive(lambda: httpserver.handle_request(file_kecil)), None),
+    ]
+    hasil = {}
+    print(f"{'pengukuran':>18} {'response/detik':>15} {'speedup':>8}")
+    for nama, fungsi, pembanding in pengukuran:
+        hasil[nama] = ukur(fungsi, jumlah)
+        speedup = f"{hasil[nama] / hasil[pembanding]:>7.1f}x" if pembanding else ''
+        print(f"{nama:>18} {hasil[nama]:>15,.0f} {speedup:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ import socket
 import base64
 import json
 import os
+from urllib.parse import quote
 
 def send_http_request(host, port, method, path, headers=None, body=None):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -15,12 +16,27 @@ def send_http_request(host, port, method, path, headers=None, body=None):
             for key, value in headers.items():
                 header_lines.append(f"{key}: {value}\r\n")
         
+        # Encode the body first, Content-Length must be its size in bytes
+        body_bytes = b""
+        if body and not hasattr(body, 'read'):
+            if isinstance(body, (dict, list)):
+                body_bytes = json.dumps(body).encode('utf-8')
+            elif isinstance(body, str):
+                body_bytes = body.encode('utf-8')
+            elif isinstance(body, bytes):
+                body_bytes = body
+            else:
+                raise TypeError("Request body must be dict, list, str, bytes or a file")
+
         if body:
             # Ensure Content-Length is set if there's a body
-            if not any(h.lower().startswith('content-length:') for h in (headers if headers else {})):
-                 header_lines.append(f"Content-Length: {len(body)}\r\n")
+            if not any(h.lower() == 'content-length' for h in (headers if headers else {})):
+                 if hasattr(body, 'read'):
+                     header_lines.append(f"Content-Length: {os.fstat(body.fileno()).st_size}\r\n")
+                 else:
+                     header_lines.append(f"Content-Length: {len(body_bytes)}\r\n")
             # Ensure Content-Type for JSON if it's a dict/list and not already set
-            if isinstance(body, (dict, list)) and not any(h.lower().startswith('content-type:') for h in (headers if headers else {})):
+            if isinstance(body, (dict, list)) and not any(h.lower() == 'content-type' for h in (headers if headers else {})):
                 header_lines.append("Content-Type: application/json\r\n")
         
         full_headers = "".join(header_lines)
@@ -29,19 +45,10 @@ def send_http_request(host, port, method, path, headers=None, body=None):
         # Encode request string part
         request_bytes = request_str.encode('utf-8')
 
-        # Add body if present (must be bytes)
-        if body:
-            if isinstance(body, (dict, list)):
-                body_bytes = json.dumps(body).encode('utf-8')
-            elif isinstance(body, str):
-                body_bytes = body.encode('utf-8')
-            elif isinstance(body, bytes):
-                body_bytes = body
-            else:
-                raise TypeError("Request body must be dict, list, str, or bytes")
-            request_bytes += body_bytes
-            
-        s.sendall(request_bytes)
+        s.sendall(request_bytes + body_bytes)
+        if hasattr(body, 'read'):
+            # File body: sent after the headers with sendfile, not read into memory
+            s.sendfile(body)
         
         response = b""
         while True:
@@ -178,7 +185,7 @@ def list_files(host='localhost', port=8885):
         print("Gagal mendapatkan daftar file dari server.")
         print(f"Body respons:\n{body}")
 
-def upload_file(filepath, host='localhost', port=8885):
+def upload_file(filepath, host='localhost', port=8885, stream=True):
     if not filepath or not os.path.isfile(filepath): # Check if filepath is valid
         print(f"Filepath \'{filepath}\' tidak valid atau file tidak ditemukan.")
         return
@@ -187,20 +194,22 @@ def upload_file(filepath, host='localhost', port=8885):
     # Uploads will go to the 'files' directory on the server as per http.py logic for /upload
     print(f"\nMengupload file \'{filename}\' ke direktori \'files\' di server {host}:{port}...")
 
-    try:
-        with open(filepath, 'rb') as f:
-            filedata_bytes = f.read()
-        filedata_b64 = base64.b64encode(filedata_bytes).decode('utf-8')
-    except Exception as e:
-        print(f"Gagal membaca atau encode file: {e}")
-        return
+    if stream:
+        # File dikirim apa adanya (application/octet-stream) dengan sendfile,
+        # tanpa base64 dan tanpa dibaca seluruhnya ke memori
+        try:
+            with open(filepath, 'rb') as f:
+                resp_bytes = send_http_request(host, port, "POST", f"/upload?filename={quote(filename)}",
+                                               headers={"Content-Type": "application/octet-stream"},
+                                               body=f)
+        except OSError as e:
+            print(f"Gagal membaca file: {e}")
+            return
+    else:
+        resp_bytes = upload_file_json(filepath, filename, host, port)
+        if resp_bytes is False:
+            return
 
-    payload = {'filename': filename, 'filedata': filedata_b64}
-    
-    resp_bytes = send_http_request(host, port, "POST", "/upload", 
-                                   headers={"Content-Type": "application/json"}, 
-                                   body=payload)
-    
     status_line, headers, body = parse_response(resp_bytes)
 
     if not status_line:
@@ -211,6 +220,23 @@ def upload_file(filepath, host='localhost', port=8885):
     print(f"Respons Server:\n{body.strip()}")
 
 
+def upload_file_json(filepath, filename, host, port):
+    # Cara lama: isi file di-encode base64 di dalam body JSON
+    try:
+        with open(filepath, 'rb') as f:
+            filedata_bytes = f.read()
+        filedata_b64 = base64.b64encode(filedata_bytes).decode('utf-8')
+    except Exception as e:
+        print(f"Gagal membaca atau encode file: {e}")
+        return False
+
+    payload = {'filename': filename, 'filedata': filedata_b64}
+    
+    return send_http_request(host, port, "POST", "/upload", 
+                             headers={"Content-Type": "application/json"}, 
+                             body=payload)
+
+
 def delete_file(filename_on_server, host='localhost', port=8885):
     if not filename_on_server: # Check if filename is provided
         print("Nama file untuk dihapus tidak boleh kosong.")
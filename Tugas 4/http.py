@@ -1,12 +1,529 @@
 import sys
 import os
+import stat
+import gzip
+import asyncio
 import os.path
-from datetime import datetime
+import re
 import json
 import base64
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from email.message import Message
+from urllib.parse import parse_qs
 
-class HttpServer:
+
+class HttpRequest:
+    """One parsed request. The body is never decoded: it is a memoryview over the
+    received bytes, or a file (body_file) when it is larger than the parser's
+    spool_size or the parser's spool hook supplied one."""
+    def __init__(self, method='', path='', version='HTTP/1.0', headers=None, error=None,
+                 error_status=(400, 'Bad Request')):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers if headers is not None else {}
+        self.body = b''
+        self.body_file = None
+        self.error = error  # set for malformed requests, answered with error_status
+        self.error_status = error_status
+
+    @property
+    def keep_alive(self):
+        # HTTP/1.1 is persistent unless the client sends "Connection: close",
+        # HTTP/1.0 (e.g. ab -k) only when it asks for "Connection: keep-alive"
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return 'close' not in connection
+        return 'keep-alive' in connection
+
+
+class HttpRequestParser:
+    """Incremental, bytes-native HTTP/1.x request parser shared by all servers.
+
+    feed() the bytes as they arrive from the socket; it returns the requests
+    that became complete (possibly several when the client pipelines). Each byte
+    is scanned once, so parsing cost is linear in the request size.
+
+    spool is an optional hook called with each request once its headers are
+    parsed; when it returns a file-like object the body is written there as it
+    arrives (HttpServer.upload_spool streams /upload bodies into place this way).
+    """
+    def __init__(self, max_header_size=64*1024, spool_size=1024*1024, spool=None):
+        self.max_header_size = max_header_size
+        self.spool_size = spool_size
+        self.spool = spool
+        self.buf = bytearray()
+        self.scan_from = 0      # where to resume searching for the end of the headers
+        self.pending = None     # request whose body is still arriving
+        self.remaining = 0      # body bytes still expected for pending
+        self.failed = False
+
+    def feed(self, data):
+        self.buf += data
+        requests = []
+        while not self.failed:
+            request = self.pending or self.parse_head()
+            if request is None:
+                break
+            if request.error is None and not self.read_body(request):
+                break
+            requests.append(request)
+        return requests
+
+    def parse_head(self):
+        # Tolerate stray CRLFs between requests (e.g. after a POST body)
+        while self.buf.startswith(b"\r\n"):
+            del self.buf[:2]
+        idx = self.buf.find(b"\r\n\r\n", self.scan_from)
+        if idx < 0:
+            if len(self.buf) > self.max_header_size:
+                return self.fail('Request header too large')
+            self.scan_from = max(0, len(self.buf) - 3)
+            return None
+        lines = bytes(self.buf[:idx]).decode('utf-8', errors='ignore').split("\r\n")
+        del self.buf[:idx + 4]
+        self.scan_from = 0
+
+        parts = lines[0].split(" ")
+        if not lines[0]:
+            return self.fail('Empty request line')
+        if len(parts) < 2:
+            return self.fail('Malformed request line')
+        headers = {}
+        for header_line in lines[1:]:
+            key, sep, value = header_line.partition(":")
+            if sep:
+                headers[key.strip().lower()] = value.strip()
+        version = parts[2].strip().upper() if len(parts) > 2 else 'HTTP/1.0'
+        request = HttpRequest(parts[0].upper().strip(), parts[1].strip(), version, headers)
+        if 'transfer-encoding' in headers:
+            # Chunked request bodies are not supported. Their length is not known from
+            # the headers, so the body cannot be skipped either: answer and close
+            return self.fail('Transfer-Encoding not supported', (501, 'Not Implemented'))
+        try:
+            self.remaining = int(headers.get('content-length', 0))
+        except ValueError:
+            return self.fail('Invalid Content-Length')
+        if self.remaining < 0:
+            return self.fail('Invalid Content-Length')
+        if self.spool is not None:
+            request.body_file = self.spool(request)
+        if request.body_file is None and self.remaining > self.spool_size:
+            # Large bodies go to disk as they arrive instead of growing the buffer
+            request.body_file = tempfile.TemporaryFile()
+        self.pending = request
+        return request
+
+    @property
+    def spooling(self):
+        # True while a large body is being written to its temporary file
+        return self.pending is not None and self.pending.body_file is not None
+
+    def read_body(self, request):
+        # True once the whole body of request has been received
+        if request.body_file is not None:
+            n = min(self.remaining, len(self.buf))
+            request.body_file.write(self.buf[:n])
+            del self.buf[:n]
+            self.remaining -= n
+            if self.remaining:
+                return False
+            request.body_file.seek(0)
+        elif self.remaining:
+            if len(self.buf) < self.remaining:
+                return False
+            # The body stays in the old buffer and is exposed as a memoryview,
+            # only the (usually empty) rest is copied into a new buffer
+            data = self.buf
+            self.buf = bytearray(data[self.remaining:])
+            request.body = memoryview(data)[:self.remaining]
+        self.pending = None
+        return True
+
+    def fail(self, message, status=(400, 'Bad Request')):
+        # The connection cannot be resynchronised after a malformed request
+        self.failed = True
+        self.pending = None
+        return HttpRequest(error=message, error_status=status)
+
+
+def body_chunks(body, chunk_size=64*1024):
+    # Iterate over a request body (bytes/memoryview or spooled file) in bounded pieces
+    if hasattr(body, 'read'):
+        yield from iter(lambda: body.read(chunk_size), b'')
+    else:
+        body = memoryview(body)
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+
+def header_message(name, value):
+    # email.message.Message parses header parameters (boundary, filename, RFC 2231)
+    msg = Message()
+    msg[name] = value
+    return msg
+
+
+class MultipartParser:
+    """Incremental multipart/form-data parser: feed() the body as it arrives.
+
+    The body of the first part that carries a filename is passed to on_data
+    piece by piece, other parts are skipped, so a file field never has to fit
+    in memory. Malformed bodies raise ValueError (close() checks that the
+    closing delimiter was seen).
+    """
+    def __init__(self, boundary, on_data, max_header_size=16*1024):
+        # Starting the buffer with CRLF lets the first delimiter match like the others
+        self.buf = bytearray(b"\r\n")
+        self.delimiter = b"\r\n--" + boundary.encode('latin-1')
+        self.on_data = on_data
+        self.max_header_size = max_header_size
+        self.state = 'preamble'  # preamble, delimiter, header, body, done
+        self.filename = None
+        self.in_file = False
+
+    def feed(self, data):
+        self.buf += data
+        while True:
+            if self.state == 'preamble':
+                idx = self.buf.find(self.delimiter)
+                if idx < 0:
+                    del self.buf[:max(0, len(self.buf) - len(self.delimiter))]
+                    return
+                del self.buf[:idx + len(self.delimiter)]
+                self.state = 'delimiter'
+            elif self.state == 'delimiter':
+                # After a delimiter: "--" ends the body, otherwise the part headers follow
+                if len(self.buf) < 2:
+                    return
+                if self.buf.startswith(b"--"):
+                    self.state = 'done'
+                else:
+                    self.state = 'header'
+            elif self.state == 'header':
+                idx = self.buf.find(b"\r\n\r\n")
+                if idx < 0:
+                    if len(self.buf) > self.max_header_size:
+                        raise ValueError('Multipart part header too large')
+                    return
+                # The first line is the rest of the delimiter line
+                lines = bytes(self.buf[:idx]).decode('utf-8', errors='ignore').split("\r\n")[1:]
+                del self.buf[:idx + 4]
+                disposition = ''
+                for line in lines:
+                    key, sep, value = line.partition(":")
+                    if sep and key.strip().lower() == 'content-disposition':
+                        disposition = value.strip()
+                filename = header_message('Content-Disposition', disposition).get_filename()
+                self.in_file = filename is not None and self.filename is None
+                if self.in_file:
+                    self.filename = filename
+                self.state = 'body'
+            elif self.state == 'body':
+                idx = self.buf.find(self.delimiter)
+                if idx >= 0:
+                    if self.in_file and idx:
+                        self.on_data(self.buf[:idx])
+                    del self.buf[:idx + len(self.delimiter)]
+                    self.in_file = False
+                    self.state = 'delimiter'
+                    continue
+                # Keep a tail that may be the start of a delimiter split across chunks
+                keep = len(self.delimiter) - 1
+                if len(self.buf) > keep:
+                    if self.in_file:
+                        self.on_data(self.buf[:-keep])
+                    del self.buf[:-keep]
+                return
+            else:
+                # Epilogue after the closing delimiter is ignored
+                self.buf.clear()
+                return
+
+    def close(self):
+        if self.state != 'done':
+            raise ValueError('Truncated multipart body')
+
+
+class UploadSpool:
+    """Write target for the body of a streaming /upload: the file data goes straight
+    into a temporary file in the upload directory, which commit() renames into
+    place, so an upload is written to disk exactly once. Raw bodies are stored
+    as-is, multipart bodies are split on the fly and only the file part is kept.
+    Errors are kept until finish() so the rest of the body can still be consumed.
+    """
+    def __init__(self, directory, boundary=None):
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        self.file = os.fdopen(fd, 'wb')
+        os.fchmod(fd, 0o644)
+        self.multipart = MultipartParser(boundary, self.file.write) if boundary is not None else None
+        self.error = None
+
+    @property
+    def filename(self):
+        # Filename from the multipart part header, None for raw bodies
+        return self.multipart.filename if self.multipart is not None else None
+
+    def write(self, data):
+        if self.error is None:
+            try:
+                if self.multipart is not None:
+                    self.multipart.feed(data)
+                else:
+                    self.file.write(data)
+            except (ValueError, OSError) as e:
+                self.error = e
+        return len(data)
+
+    def seek(self, offset):
+        # HttpRequestParser seeks to the start once the body is complete
+        pass
+
+    def finish(self):
+        # Raise the first error seen while writing (ValueError: malformed body)
+        if self.error is None and self.multipart is not None:
+            try:
+                self.multipart.close()
+            except ValueError as e:
+                self.error = e
+        if self.error is not None:
+            raise self.error
+        self.file.close()
+
+    def commit(self, target):
+        os.replace(self.path, target)
+        self.path = None
+
+    def close(self):
+        # Removes the temporary file unless it was committed
+        self.file.close()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def __del__(self):
+        # A connection dropped mid-upload leaves no temporary file behind
+        self.close()
+
+
+class FileResponse:
+    """Response whose body is sent straight from an open file: the servers write
+    the header block and then let the kernel copy the body (socket.sendfile /
+    loop.sendfile), so large files never pass through userspace buffers.
+
+    pieces lists the response in sending order: bytes to write as-is, or
+    (offset, count) ranges of the file. A plain or single-range response is
+    [header, (offset, count)]; multipart/byteranges adds one part header and
+    range per extra range, then the closing boundary (extra, trailer)."""
+    def __init__(self, header, file, offset=0, count=0, extra=(), trailer=b""):
+        self.file = file
+        self.pieces = [header, (offset, count)]
+        for part_header, part_offset, part_count in extra:
+            self.pieces.append(part_header)
+            self.pieces.append((part_offset, part_count))
+        if trailer:
+            self.pieces.append(trailer)
+
+    def to_bytes(self):
+        # Fallback for callers that need the whole response in memory
+        try:
+            hasil = []
+            for piece in self.pieces:
+                if isinstance(piece, tuple):
+                    self.file.seek(piece[0])
+                    piece = self.file.read(piece[1])
+                hasil.append(piece)
+            return b"".join(hasil)
+        finally:
+            self.close()
+
+    def close(self):
+        self.file.close()
+
+
+class StaticFileCache:
+    """Byte-budgeted LRU cache of small static files, keyed by absolute path.
+
+    An entry holds (body length, data, etag, mtime) where data is the pre-encoded,
+    request-independent part of the response: the entity headers and the body;
+    etag/mtime let conditional requests be answered from the cache. It is revalidated against the file's
+    mtime/size with a stat() on every hit, or, when ttl is set, trusted for ttl
+    seconds without touching the filesystem at all.
+    """
+    def __init__(self, max_bytes=16*1024*1024, max_entry_size=256*1024, ttl=None):
+        self.max_bytes = max_bytes
+        self.max_entry_size = max_entry_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # path -> [mtime_ns, size, checked_at, (length, data)]
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry is not None:
+            now = time.monotonic()
+            if self.ttl is None or now - entry[2] > self.ttl:
+                try:
+                    st = os.stat(path)
+                    valid = (st.st_mtime_ns, st.st_size) == (entry[0], entry[1])
+                except OSError:
+                    valid = False
+                if not valid:
+                    self.invalidate(path)
+                    entry = None
+                else:
+                    entry[2] = now
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if path in self.entries:
+                self.entries.move_to_end(path)
+            return entry[3]
+
+    def put(self, path, st, value):
+        size = len(value[1])
+        if size > self.max_entry_size or size > self.max_bytes:
+            return
+        with self.lock:
+            lama = self.entries.pop(path, None)
+            if lama is not None:
+                self.used -= len(lama[3][1])
+            self.entries[path] = [st.st_mtime_ns, st.st_size, time.monotonic(), value]
+            self.used += size
+            # Evict least recently used entries until we are back under budget
+            while self.used > self.max_bytes:
+                _, lama = self.entries.popitem(last=False)
+                self.used -= len(lama[3][1])
+
+    def cached_size(self, path):
+        # File size recorded for path, None if it is not cached (no revalidation)
+        with self.lock:
+            entry = self.entries.get(path)
+            return None if entry is None else entry[1]
+
+    def invalidate(self, path):
+        with self.lock:
+            lama = self.entries.pop(path, None)
+            if lama is not None:
+                self.used -= len(lama[3][1])
+
+    def stats(self):
+        with self.lock:
+            return dict(entries=len(self.entries), bytes=self.used, max_bytes=self.max_bytes,
+                        hits=self.hits, misses=self.misses)
+
+
+class SingleFlight:
+    """Coalesces concurrent loads of the same key: the first caller runs the
+    load, callers arriving while it is in flight wait for and share its result.
+
+    do() is for threads (thread pool servers), do_async() is the awaitable
+    variant for asyncio servers; it runs the load in an executor.
+    """
     def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}    # key -> [threading.Event, result, exception]
+        self.futures = {}  # key -> asyncio future of the load in flight
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = [threading.Event(), None, None]
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+        try:
+            call[1] = fn()
+            return call[1]
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call[0].set()
+
+    async def do_async(self, key, fn, executor=None):
+        future = self.futures.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(executor, fn)
+            self.futures[key] = future
+            future.add_done_callback(lambda f: self.futures.pop(key, None))
+        # shield: a waiter being cancelled must not cancel the shared load
+        return await asyncio.shield(future)
+
+
+# ASCII digits only: str.isdigit() also accepts e.g. '²', which int() rejects
+DIGITS = re.compile(r'[0-9]+')
+
+
+def parse_range(value, size, max_ranges=16):
+    """Parse a Range header against a file of `size` bytes.
+
+    Returns a list of inclusive (start, end) pairs, [] when no range is
+    satisfiable (416), or None when the header must be ignored and the whole
+    file served: unknown unit, bad syntax or more than max_ranges ranges.
+    """
+    unit, sep, spec = value.partition('=')
+    if not sep or unit.strip().lower() != 'bytes':
+        return None
+    specs = [x.strip() for x in spec.split(',') if x.strip()]
+    if not specs or len(specs) > max_ranges:
+        return None
+    ranges = []
+    for x in specs:
+        first, sep, last = x.partition('-')
+        first, last = first.strip(), last.strip()
+        if not sep or not (DIGITS.fullmatch(first) or (not first and DIGITS.fullmatch(last))) or (last and not DIGITS.fullmatch(last)):
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            if int(last) > 0 and size > 0:
+                ranges.append((max(0, size - int(last)), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < size:
+            ranges.append((start, min(int(last), size - 1) if last else size - 1))
+    return ranges
+
+
+def send_response(sock, response):
+    # Send a response (bytes or FileResponse) over a blocking socket
+    if isinstance(response, FileResponse):
+        try:
+            for piece in response.pieces:
+                if not isinstance(piece, tuple):
+                    sock.sendall(piece)
+                elif piece[1]:
+                    sock.sendfile(response.file, piece[0], piece[1])
+        finally:
+            response.close()
+    else:
+        sock.sendall(response)
+
+
+class HttpServer:
+    def __init__(self, keep_alive_timeout=5, max_keep_alive_requests=100,
+                 cache_bytes=16*1024*1024, cache_ttl=None, preload=False, weak_etags=False,
+                 gzip_min_size=256, gzip_max_size=1024*1024, gzip_level=6):
         self.sessions = {}
         self.types = {}
         self.types['.pdf'] = 'application/pdf'
@@ -14,6 +531,25 @@ class HttpServer:
         self.types['.txt'] = 'text/plain'
         self.types['.html'] = 'text/html'
         self.types['.json'] = 'application/json'
+        # Cache-Control per content type (None: header not sent). Images and
+        # documents rarely change; text is revalidated on every use, which the
+        # ETag/Last-Modified validators turn into cheap 304 responses
+        self.cache_control = {}
+        self.cache_control['application/pdf'] = 'public, max-age=86400'
+        self.cache_control['image/jpeg'] = 'public, max-age=86400'
+        self.cache_control['text/plain'] = 'no-cache'
+        self.cache_control['text/html'] = 'no-cache'
+        self.cache_control['application/json'] = 'no-cache'
+        self.cache_control['application/octet-stream'] = 'no-cache'
+        # weak_etags=True sends W/"..." validators (no byte-for-byte guarantee)
+        self.weak_etags = weak_etags
+        # Content types sent gzip-compressed to clients that accept it. Bodies smaller
+        # than gzip_min_size are not worth it (gzip_min_size=None disables gzip); files
+        # above gzip_max_size are only sent compressed from a precompressed .gz sidecar
+        self.compressible = {'text/plain', 'text/html', 'application/json'}
+        self.gzip_min_size = gzip_min_size
+        self.gzip_max_size = gzip_max_size
+        self.gzip_level = gzip_level
 
         self.file_dir = 'files'  # Directory for file uploads
         if not os.path.exists(self.file_dir):
@@ -21,65 +557,413 @@ class HttpServer:
         if not os.path.isdir(self.file_dir):
             print(f"Error: '{self.file_dir}' exists but is not a directory. Operations may fail.", file=sys.stderr)
 
-    def response(self, kode=404, message='Not Found', messagebody_input=b"", headers=None):
-        if headers is None:
-            headers = {}
-        tanggal = datetime.now().strftime('%c')
+        # HTTP/1.1 persistent connections: the servers close a connection after it has
+        # been idle for keep_alive_timeout seconds or served max_keep_alive_requests requests
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        # Per-thread flag set by handle() so response() can emit the right Connection header
+        self.local = threading.local()
+
+        # Small static files are kept in memory (cache_bytes=0 disables the cache),
+        # preload=True fills the cache from the document root at startup
+        self.cache = StaticFileCache(max_bytes=cache_bytes, ttl=cache_ttl)
+        # Pre-encoded pieces of the response header, see response_prefix()
+        self.status_lines = {}
+        self.date_cache = (None, b"")
+        self.connection_keep_alive = (f"Connection: keep-alive\r\n"
+                                      f"Keep-Alive: timeout={self.keep_alive_timeout}, max={self.max_keep_alive_requests}\r\n"
+                                      f"Server: myserver/1.0\r\n").encode('utf-8')
+        self.connection_close = b"Connection: close\r\nServer: myserver/1.0\r\n"
+        # Routes whose response never changes: (code, message, body length, headers + body)
+        self.constant_routes = {}
+        self.add_constant_route('/', 200, 'OK', b'Ini Adalah web Server percobaan')
+        self.add_constant_route('/video', 302, 'Found', b'', {'Location': 'https://youtu.be/katoxpnTf04'})
+        self.add_constant_route('/santai', 200, 'OK', b'santai saja')
+
+        # Concurrent cache misses on the same file share one disk read
+        self.loads = SingleFlight()
+        # Compressed variants, keyed by the path of the original file and revalidated
+        # against it like self.cache (entries also record the .gz sidecar they used).
+        # Any file up to gzip_max_size is compressed, so its variant must fit in an
+        # entry; the slack covers gzip overhead on incompressible data and the headers
+        self.gzip_cache = StaticFileCache(max_bytes=cache_bytes,
+                                          max_entry_size=max(self.cache.max_entry_size, self.gzip_max_size + 4096),
+                                          ttl=cache_ttl)
+        if preload:
+            self.preload('.')
+
+    def add_constant_route(self, path, kode, message, body, headers=None):
+        self.constant_routes[path] = (kode, message, len(body), self.header_lines(headers) + body)
+
+    def preload(self, directory):
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.stat().st_size <= self.cache.max_entry_size:
+                    self.load_file(os.path.abspath(entry.path))
+        print(f"Preloaded {self.cache.stats()['entries']} files into the cache", file=sys.stderr)
+
+    def content_type(self, path):
+        fext = os.path.splitext(path)[1].lower()
+        return self.types.get(fext, 'application/octet-stream')
+
+    def etag(self, st):
+        # Validator from the file identity: changes whenever the file is replaced or modified
+        tag = f'"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"'
+        return 'W/' + tag if self.weak_etags else tag
+
+    def gzip_etag(self, st):
+        # A compressed variant has different bytes, so it needs its own validator
+        return self.etag(st)[:-1] + '-gz"'
+
+    def varies_on_encoding(self, path):
+        # Responses for gzip-able files depend on Accept-Encoding (200 and 304 alike)
+        return self.gzip_min_size is not None and self.content_type(path) in self.compressible
 
+    def entity_headers(self, path, st):
+        headers = {'Content-Type': self.content_type(path), 'Accept-Ranges': 'bytes'}
+        if self.varies_on_encoding(path):
+            headers['Vary'] = 'Accept-Encoding'
+        headers.update(self.validator_headers(path, self.etag(st), int(st.st_mtime)))
+        return headers
+
+    def gzip_headers(self, path, st):
+        headers = self.entity_headers(path, st)
+        headers['Content-Encoding'] = 'gzip'
+        headers['ETag'] = self.gzip_etag(st)
+        return headers
+
+    @staticmethod
+    def accepts_gzip(request_headers):
+        # Accept-Encoding negotiation: gzip (or *) with a non-zero q value
+        value = request_headers.get('accept-encoding')
+        if not value:
+            return False
+        codings = {}
+        for item in value.split(','):
+            coding, _, params = item.partition(';')
+            q = 1.0
+            params = params.strip().lower()
+            if params.startswith('q='):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            codings[coding.strip().lower()] = q
+        q = codings.get('gzip', codings.get('x-gzip', codings.get('*', 0.0)))
+        return q > 0
+
+    def gzip_wanted(self, request_headers, content_type, size):
+        return (self.gzip_min_size is not None and size >= self.gzip_min_size
+                and content_type in self.compressible and self.accepts_gzip(request_headers))
+
+    def gzip_get(self, path, request_headers):
+        # gzip variant of a static file: a .gz sidecar at least as new as the file is
+        # sent as-is, otherwise the file is compressed once and kept in gzip_cache.
+        # None means the identity response should be sent instead
+        content_type = self.content_type(path)
+        if not self.gzip_wanted(request_headers, content_type, self.gzip_min_size or 0):
+            return None
+        # Hot paths touch the filesystem no more than the identity cache does:
+        # files known to be too small are skipped and a gzip_cache hit needs no
+        # stat at all with cache_ttl set (one for path otherwise)
+        size = self.cache.cached_size(path)
+        if size is not None and size < self.gzip_min_size:
+            return None
+        cached = self.gzip_cache.get(path)
+        if cached is not None and self.gzip_cache.ttl is None and self.sidecar_state(path) != cached[4]:
+            # A .gz sidecar appeared, changed or disappeared since the entry was made
+            self.gzip_cache.invalidate(path)
+            cached = None
+        if cached is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            if not stat.S_ISREG(st.st_mode) or st.st_size < self.gzip_min_size:
+                return None
+            sidecar = path + '.gz'
+            sidecar_st = self.sidecar_stat(path)
+            if sidecar_st is not None and sidecar_st.st_mtime_ns >= st.st_mtime_ns:
+                source, source_st = sidecar, sidecar_st
+            elif st.st_size <= self.gzip_max_size:
+                source, source_st = path, st
+            else:
+                return None
+
+            etag, mtime = self.gzip_etag(source_st), int(source_st.st_mtime)
+            if self.not_modified(request_headers, etag, mtime):
+                return self.not_modified_response(path, etag, mtime)
+            if source == sidecar and source_st.st_size > self.gzip_cache.max_entry_size:
+                # Large sidecars are streamed with sendfile like any large file
+                fp = open(sidecar, 'rb')
+                fst = os.fstat(fp.fileno())
+                header = self.response_header(200, 'OK', fst.st_size, self.gzip_headers(path, fst))
+                return FileResponse(header, fp, 0, fst.st_size)
+            cached = self.loads.do((path, 'gzip'), lambda: self.load_gzip(path, source, st, sidecar_st))
+        length, data, etag, mtime, _ = cached
+        if self.not_modified(request_headers, etag, mtime):
+            return self.not_modified_response(path, etag, mtime)
+        return self.response_prefix(200, 'OK', length) + data
+
+    @staticmethod
+    def sidecar_stat(path):
+        # stat of the regular file path + '.gz', None if there is none
+        try:
+            st = os.stat(path + '.gz')
+        except OSError:
+            return None
+        return st if stat.S_ISREG(st.st_mode) else None
+
+    def sidecar_state(self, path):
+        st = self.sidecar_stat(path)
+        return None if st is None else (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load_gzip(self, path, source, st, sidecar_st):
+        # Like load_file() for the gzip variant of path, made from source (the file
+        # itself, compressed here, or its .gz sidecar). The entry is keyed by path and
+        # validated against path's st; it also records the sidecar it was made with
+        with open(source, 'rb') as fp:
+            source_st = os.fstat(fp.fileno())
+            isi = fp.read()
+        if source == path:
+            isi = gzip.compress(isi, self.gzip_level, mtime=0)
+        headers = self.gzip_headers(path, source_st)
+        sidecar_state = None if sidecar_st is None else (sidecar_st.st_ino, sidecar_st.st_mtime_ns, sidecar_st.st_size)
+        value = (len(isi), self.header_lines(headers) + isi, headers['ETag'], int(source_st.st_mtime), sidecar_state)
+        self.gzip_cache.put(path, st, value)
+        return value
+
+    def validator_headers(self, path, etag, mtime):
+        headers = {'ETag': etag, 'Last-Modified': formatdate(mtime, usegmt=True)}
+        cache_control = self.cache_control.get(self.content_type(path))
+        if cache_control:
+            headers['Cache-Control'] = cache_control
+        return headers
+
+    @staticmethod
+    def http_date(value):
+        # Seconds since the epoch from an HTTP date, None if it cannot be parsed
+        try:
+            return int(parsedate_to_datetime(value).timestamp())
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def not_modified(self, request_headers, etag, mtime):
+        # If-None-Match (weak comparison) takes precedence over If-Modified-Since
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+            tags = [t.strip() for t in if_none_match.split(',')]
+            return any(t.removeprefix('W/') == etag.removeprefix('W/') for t in tags)
+        if_modified_since = request_headers.get('if-modified-since')
+        if if_modified_since is not None:
+            since = self.http_date(if_modified_since)
+            return since is not None and mtime <= since
+        return False
+
+    def range_allowed(self, request_headers, etag, mtime):
+        # If-Range: the range only applies if the client's copy is still current,
+        # otherwise the whole file is sent. An ETag must match strongly
+        if_range = request_headers.get('if-range')
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            return not etag.startswith('W/') and if_range == etag
+        return self.http_date(if_range) == mtime
+
+    def not_modified_response(self, path, etag, mtime):
+        # 304 carries the validators but no body, and no Content-Length either
+        # (it would have to equal the length of the 200 body, RFC 7230 3.3.2).
+        # Vary is repeated as the 200 would send it (RFC 7232 4.1)
+        headers = self.validator_headers(path, etag, mtime)
+        if self.varies_on_encoding(path):
+            headers['Vary'] = 'Accept-Encoding'
+        return self.response_header(304, 'Not Modified', None, headers)
+
+    def load_file(self, path):
+        # Read a small file and cache its entity headers + body;
+        # returns (body length, data, etag, mtime) as stored in the cache
+        with open(path, 'rb') as fp:
+            st = os.fstat(fp.fileno())
+            isi = fp.read()
+        value = (len(isi), self.header_lines(self.entity_headers(path, st)) + isi, self.etag(st), int(st.st_mtime))
+        self.cache.put(path, st, value)
+        return value
+
+    async def handle_request_async(self, request, allow_keep_alive=True, executor=None):
+        # handle_request() for asyncio servers: constant routes are answered on the
+        # event loop, everything that may touch the disk (stat, open, uploads, gzip)
+        # runs in executor so one slow request does not stall the other connections
+        if request.error is None and request.method == 'GET':
+            if request.path in self.constant_routes:
+                return self.handle_request(request, allow_keep_alive)
+            try:
+                await self.warm_cache(request.path, executor)
+            except OSError:
+                # Best effort only: handle_request() below reports the error (500)
+                pass
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.handle_request, request, allow_keep_alive)
+
+    def cacheable_path(self, object_address):
+        # Absolute path of a static file that belongs in the cache, None otherwise
+        path = self.resolve_path(object_address)
+        if path is None or not self.cache.max_bytes:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path) or st.st_size > self.cache.max_entry_size:
+            return None
+        return path
+
+    async def warm_cache(self, object_address, executor=None):
+        # For asyncio servers: load a missing small file off the event loop before
+        # handle_request(); concurrent requests for the same file await one load
+        path = self.resolve_path(object_address)
+        if path is None or path in self.cache.entries:
+            return
+        loop = asyncio.get_running_loop()
+        path = await loop.run_in_executor(executor, self.cacheable_path, object_address)
+        if path is not None:
+            await self.loads.do_async(path, lambda: self.load_file(path), executor)
+
+    def resolve_path(self, object_address):
+        target_file_path_relative = object_address
+        if target_file_path_relative.startswith('/'):
+            target_file_path_relative = target_file_path_relative[1:]
+
+        # Security: Prevent access outside current directory.
+        base_dir = os.path.abspath(".")
+        abs_target_path = os.path.abspath(os.path.join(base_dir, target_file_path_relative))
+
+        if not abs_target_path.startswith(base_dir):
+            return None
+        return abs_target_path
+
+    def range_response(self, fp, path, st, range_header):
+        # 206 for one range, multipart/byteranges for several, 416 when none is
+        # satisfiable; None when the header is ignored (send the whole file).
+        # The ranges are streamed from fp with sendfile like a full file; fp stays
+        # the caller's to close unless a FileResponse is returned
+        size = st.st_size
+        ranges = parse_range(range_header, size)
+        if ranges is None:
+            return None
+        content_type = self.content_type(path)
+        if not ranges:
+            return self.response(416, 'Range Not Satisfiable', b'', {'Content-Range': f'bytes */{size}'})
+        entity_headers = self.entity_headers(path, st)
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            headers_resp = dict(entity_headers, **{'Content-Range': f'bytes {start}-{end}/{size}'})
+            return FileResponse(self.response_header(206, 'Partial Content', end - start + 1, headers_resp),
+                                fp, start, end - start + 1)
+
+        boundary = os.urandom(12).hex()
+        parts = []
+        for start, end in ranges:
+            part_header = (f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\n"
+                           f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode('utf-8')
+            parts.append((part_header, start, end - start + 1))
+        trailer = f"\r\n--{boundary}--\r\n".encode('utf-8')
+        content_length = sum(len(h) + n for h, _, n in parts) + len(trailer)
+        headers_resp = dict(entity_headers, **{'Content-Type': f'multipart/byteranges; boundary={boundary}'})
+        header = self.response_header(206, 'Partial Content', content_length, headers_resp)
+        # The first part header goes out together with the response header
+        first_header, first_offset, first_count = parts[0]
+        return FileResponse(header + first_header, fp, first_offset, first_count, parts[1:], trailer)
+
+    def response(self, kode=404, message='Not Found', messagebody_input=b"", headers=None):
         if not isinstance(messagebody_input, bytes):
             messagebody_bytes = messagebody_input.encode('utf-8')
         else:
             messagebody_bytes = messagebody_input
-        
-        resp_lines=[]
-        resp_lines.append(f"HTTP/1.0 {kode} {message}\r\n")
-        resp_lines.append(f"Date: {tanggal}\r\n")
-        resp_lines.append("Connection: close\r\n")
-        resp_lines.append("Server: myserver/1.0\r\n")
-        resp_lines.append(f"Content-Length: {len(messagebody_bytes)}\r\n")
-
-        for kk, vv in headers.items():
-            resp_lines.append(f"{kk}: {vv}\r\n")
-        resp_lines.append("\r\n")
+        return self.response_header(kode, message, len(messagebody_bytes), headers) + messagebody_bytes
 
-        response_headers_str = "".join(resp_lines)
-        final_response_bytes = response_headers_str.encode('utf-8') + messagebody_bytes
-        return final_response_bytes
+    def response_header(self, kode, message, content_length, headers=None):
+        # Status line and header block (including the blank line) as bytes
+        return self.response_prefix(kode, message, content_length) + self.header_lines(headers)
 
-    def proses(self, data):
-        parts = data.split("\r\n\r\n", 1)
-        header_section = parts[0]
-        body_section = parts[1] if len(parts) > 1 else ""
+    def response_prefix(self, kode, message, content_length):
+        # The per-request part of the header block; header_lines() completes it.
+        # Everything but Content-Length is pre-encoded: the status line per code,
+        # the Connection headers per keep-alive state and the Date once a second.
+        # content_length=None leaves the Content-Length header out
+        status_line = self.status_lines.get((kode, message))
+        if status_line is None:
+            status_line = f"HTTP/1.1 {kode} {message}\r\n".encode('utf-8')
+            self.status_lines[(kode, message)] = status_line
+        if getattr(self.local, 'keep_alive', False):
+            connection = self.connection_keep_alive
+        else:
+            connection = self.connection_close
+        if content_length is None:
+            return b"%s%s%s" % (status_line, self.date_header(), connection)
+        return b"%s%s%sContent-Length: %d\r\n" % (status_line, self.date_header(), connection, content_length)
 
-        requests = header_section.split("\r\n")
-        if not requests or not requests[0]:
-            return self.response(400, 'Bad Request', b'Empty request line', {})
+    def date_header(self):
+        # Date in IMF-fixdate format (RFC 7231), formatted at most once per second
+        detik = int(time.time())
+        cached_detik, header = self.date_cache
+        if cached_detik != detik:
+            header = f"Date: {formatdate(detik, usegmt=True)}\r\n".encode('ascii')
+            self.date_cache = (detik, header)
+        return header
 
-        baris = requests[0]
-        all_headers_list = [n for n in requests[1:] if n != '']
+    @staticmethod
+    def header_lines(headers=None):
+        resp_lines = [f"{kk}: {vv}\r\n" for kk, vv in (headers or {}).items()]
+        resp_lines.append("\r\n")
+        return "".join(resp_lines).encode('utf-8')
 
-        j = baris.split(" ")
-        if len(j) < 2:
-            return self.response(400, 'Bad Request', b'Malformed request line', {})
-        
+    def handle_request(self, request, allow_keep_alive=True):
+        # Returns (response, whether the connection should stay open); the response
+        # is bytes or a FileResponse, send it with send_response() or sendfile.
+        # allow_keep_alive=False forces "Connection: close" (e.g. request limit reached)
+        keep_alive = allow_keep_alive and request.error is None and request.keep_alive
+        self.local.keep_alive = keep_alive
         try:
-            method = j[0].upper().strip()
-            object_address = j[1].strip()
+            return self.dispatch(request), keep_alive
+        finally:
+            self.local.keep_alive = False
+            if request.body_file is not None:
+                request.body_file.close()
 
-            request_headers_dict = {}
-            for header_line in all_headers_list:
-                if ':' in header_line:
-                    key, value = header_line.split(":", 1)
-                    request_headers_dict[key.strip().lower()] = value.strip()
+    def handle(self, data, allow_keep_alive=True):
+        # data: one complete request as bytes (or str)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        requests = HttpRequestParser(spool=self.upload_spool).feed(data)
+        if not requests:
+            # Header block without the closing blank line
+            requests = HttpRequestParser(spool=self.upload_spool).feed(bytes(data) + b"\r\n\r\n")
+        if not requests:
+            requests = [HttpRequest(error='Incomplete request')]
+        return self.handle_request(requests[0], allow_keep_alive)
+
+    def proses(self, data):
+        hasil = self.handle(data, False)[0]
+        if isinstance(hasil, FileResponse):
+            return hasil.to_bytes()
+        return hasil
 
+    def dispatch(self, request):
+        if request.error is not None:
+            kode, message = request.error_status
+            return self.response(kode, message, request.error.encode('utf-8'), {})
+        method = request.method
+        try:
             if method == 'GET':
-                return self.http_get(object_address, request_headers_dict)
+                return self.http_get(request.path, request.headers)
             elif method == 'POST':
-                return self.http_post(object_address, request_headers_dict, body_section)
+                body = request.body_file if request.body_file is not None else request.body
+                return self.http_post(request.path, request.headers, body)
             else:
                 return self.response(405, 'Method Not Allowed', f'{method} not supported'.encode('utf-8'), {})
-        except IndexError:
-            return self.response(400, 'Bad Request', b'Malformed request line (IndexError)', {})
         except Exception as e:
             print(f"Error processing request: {e}", file=sys.stderr)
             return self.response(500, 'Internal Server Error', f'Error processing request: {str(e)}'.encode('utf-8'), {})
@@ -93,54 +977,169 @@ class HttpServer:
                 
                 file_list = os.listdir(current_working_directory)
                 files_only = [f for f in file_list if os.path.isfile(os.path.join(current_working_directory, f))]
-                json_response_body = json.dumps(files_only)
-                return self.response(200, 'OK', json_response_body.encode('utf-8'), {'Content-Type': 'application/json'})
+                json_response_body = json.dumps(files_only).encode('utf-8')
+                headers_resp = {'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'}
+                if self.gzip_wanted(request_headers, 'application/json', len(json_response_body)):
+                    json_response_body = gzip.compress(json_response_body, self.gzip_level, mtime=0)
+                    headers_resp['Content-Encoding'] = 'gzip'
+                return self.response(200, 'OK', json_response_body, headers_resp)
             except Exception as e:
                 print(f"Error listing files in root directory: {e}", file=sys.stderr)
                 return self.response(500, 'Internal Server Error', f'Error listing files: {str(e)}'.encode('utf-8'), {})
 
-        if object_address == '/':
-            return self.response(200, 'OK', b'Ini Adalah web Server percobaan', {})
-        if object_address == '/video':
-            return self.response(302, 'Found', b'', {'Location': 'https://youtu.be/katoxpnTf04'})
-        if object_address == '/santai':
-            return self.response(200, 'OK', b'santai saja', {})
+        # Constant routes: only the status line, Date and Connection headers are added
+        constant = self.constant_routes.get(object_address)
+        if constant is not None:
+            kode, message, length, data = constant
+            return self.response_prefix(kode, message, length) + data
+        if object_address == '/stats':
+            stats = dict(self.cache.stats(), gzip=self.gzip_cache.stats())
+            return self.response(200, 'OK', json.dumps(stats).encode('utf-8'), {'Content-Type': 'application/json'})
 
-        target_file_path_relative = object_address
-        if target_file_path_relative.startswith('/'):
-            target_file_path_relative = target_file_path_relative[1:]
+        abs_target_path = self.resolve_path(object_address)
+        if abs_target_path is None:
+            return self.response(403, "Forbidden", b"Access denied.", {})
 
-        # Security: Prevent access outside current directory.
-        base_dir = os.path.abspath(".") 
-        abs_target_path = os.path.abspath(os.path.join(base_dir, target_file_path_relative))
+        # Range requests are always served from the file itself
+        range_header = request_headers.get('range')
 
-        if not abs_target_path.startswith(base_dir):
-            return self.response(403, "Forbidden", b"Access denied.", {})
+        # Compressed variant for clients that accept gzip (ranges refer to the identity bytes)
+        if range_header is None:
+            compressed = self.gzip_get(abs_target_path, request_headers)
+            if compressed is not None:
+                return compressed
+
+        # Cached small files are served without opening the file
+        cached = self.cache.get(abs_target_path) if range_header is None else None
+        if cached is not None:
+            length, data, etag, mtime = cached
+            if self.not_modified(request_headers, etag, mtime):
+                return self.not_modified_response(abs_target_path, etag, mtime)
+            return self.response_prefix(200, 'OK', length) + data
 
         if os.path.isfile(abs_target_path):
+            fp = None
             try:
-                with open(abs_target_path, 'rb') as fp:
-                    isi = fp.read()
-                
-                fext = os.path.splitext(abs_target_path)[1].lower()
-                content_type = self.types.get(fext, 'application/octet-stream')
-                
-                headers_resp = {'Content-Type': content_type}
-                return self.response(200, 'OK', isi, headers_resp)
+                # The file is not read here: the server sends the body with sendfile
+                fp = open(abs_target_path, 'rb')
+                st = os.fstat(fp.fileno())
+                size = st.st_size
+                etag, mtime = self.etag(st), int(st.st_mtime)
+                if self.not_modified(request_headers, etag, mtime):
+                    return self.not_modified_response(abs_target_path, etag, mtime)
+                if range_header is not None and self.range_allowed(request_headers, etag, mtime):
+                    partial = self.range_response(fp, abs_target_path, st, range_header)
+                    if isinstance(partial, FileResponse):
+                        fp = None
+                    if partial is not None:
+                        return partial
+                if size <= self.cache.max_entry_size and self.cache.max_bytes:
+                    length, data, etag, mtime = self.loads.do(abs_target_path, lambda: self.load_file(abs_target_path))
+                    return self.response_prefix(200, 'OK', length) + data
+
+                headers_resp = self.entity_headers(abs_target_path, st)
+                response = FileResponse(self.response_header(200, 'OK', size, headers_resp), fp, 0, size)
+                fp = None  # closed by the server once the body has been sent
+                return response
             except Exception as e:
                 print(f"Error serving file {abs_target_path}: {e}", file=sys.stderr)
                 return self.response(500, 'Internal Server Error', f'Error serving file: {str(e)}'.encode('utf-8'), {})
+            finally:
+                if fp is not None:
+                    fp.close()
         else:
             return self.response(404, 'Not Found', f"Resource '{object_address}' not found.".encode('utf-8'), {})
 
-    def http_post(self, object_address, request_headers, body_str):
+    def upload_spool(self, request):
+        # HttpRequestParser hook: the body of a raw or multipart POST /upload is
+        # written straight into a temporary file in file_dir as it arrives, which
+        # store_upload then renames into place (no second copy on disk)
+        if request.method != 'POST' or request.path.partition('?')[0] != '/upload':
+            return None
+        msg = header_message('Content-Type', request.headers.get('content-type', ''))
+        media_type = msg.get_content_type()
+        try:
+            if media_type == 'application/octet-stream':
+                return UploadSpool(self.file_dir)
+            if media_type == 'multipart/form-data' and msg.get_boundary():
+                return UploadSpool(self.file_dir, msg.get_boundary())
+        except OSError:
+            # Upload directory missing or not writable, http_upload_stream reports it
+            pass
+        return None
+
+    def store_upload(self, filename, spool):
+        # Finish a fully written UploadSpool and rename it over the target, so a
+        # failed or half-finished upload never leaves a partial file behind.
+        # filename None takes the name from the multipart part header
+        try:
+            spool.finish()
+            filename = filename or spool.filename
+            if not filename:
+                raise ValueError('Missing filename')
+            base_filename = os.path.basename(filename) # Sanitize against directory traversal
+            if base_filename in ('', '.', '..'):
+                raise ValueError('Invalid filename')
+            filepath = os.path.join(self.file_dir, base_filename) # Uploads to self.file_dir
+            spool.commit(filepath)
+        finally:
+            spool.close()
+        self.cache.invalidate(os.path.abspath(filepath))
+        self.gzip_cache.invalidate(os.path.abspath(filepath))
+        return base_filename
+
+    def http_upload_stream(self, request_headers, query, body):
+        # /upload with a raw (application/octet-stream, filename in the X-Filename
+        # header or ?filename=) or multipart/form-data body. The body is normally
+        # already on disk in an UploadSpool (see upload_spool); anything else is
+        # copied into one in bounded chunks, nothing is held in memory whole
+        msg = header_message('Content-Type', request_headers.get('content-type', ''))
+        media_type = msg.get_content_type()
+        boundary = None
+        if media_type == 'application/octet-stream':
+            filename = request_headers.get('x-filename') or parse_qs(query).get('filename', [None])[0]
+            if not filename:
+                return self.response(400, 'Bad Request', b'Missing filename', {})
+        elif media_type == 'multipart/form-data':
+            boundary = msg.get_boundary()
+            if not boundary:
+                return self.response(400, 'Bad Request', b'Missing multipart boundary', {})
+            filename = None
+        else:
+            return self.response(415, 'Unsupported Media Type', b'Content-Type must be application/json, application/octet-stream or multipart/form-data', {})
+
+        if not os.path.isdir(self.file_dir):
+            return self.response(500, 'Internal Server Error', f"Upload directory '{self.file_dir}' is not accessible.".encode('utf-8'), {})
+        try:
+            if isinstance(body, UploadSpool):
+                spool = body
+            else:
+                spool = UploadSpool(self.file_dir, boundary)
+                for chunk in body_chunks(body):
+                    spool.write(chunk)
+            base_filename = self.store_upload(filename, spool)
+            return self.response(200, 'OK', f"File '{base_filename}' uploaded successfully to '{self.file_dir}'.".encode('utf-8'), {'Content-Type': 'text/plain'})
+        except ValueError as e:
+            return self.response(400, 'Bad Request', str(e).encode('utf-8'), {})
+        except OSError as e:
+            print(f"Error writing upload {filename}: {e}", file=sys.stderr)
+            return self.response(500, 'Internal Server Error', f'Error writing file: {str(e)}'.encode('utf-8'), {})
+
+    def http_post(self, object_address, request_headers, body):
+        # body: request body as bytes/memoryview, or a file object for large bodies
+        object_address, _, query = object_address.partition('?')
         content_type = request_headers.get('content-type', '').lower()
+        if object_address == '/upload' and 'application/json' not in content_type:
+            return self.http_upload_stream(request_headers, query, body)
         if 'application/json' not in content_type:
             return self.response(415, 'Unsupported Media Type', b'Content-Type must be application/json', {})
 
         try:
-            payload = json.loads(body_str)
-        except json.JSONDecodeError:
+            if hasattr(body, 'read'):
+                payload = json.load(body)
+            else:
+                payload = json.loads(bytes(body))
+        except (json.JSONDecodeError, UnicodeDecodeError):
             return self.response(400, 'Bad Request', b'Invalid JSON body', {})
 
         if object_address == '/upload':
@@ -153,13 +1152,13 @@ class HttpServer:
             if not filename or not filedata_b64:
                 return self.response(400, 'Bad Request', b'Missing filename or filedata', {})
             
-            base_filename = os.path.basename(filename) # Sanitize against directory traversal
-            filepath = os.path.join(self.file_dir, base_filename) # Uploads to self.file_dir
-            
+            filepath = os.path.join(self.file_dir, os.path.basename(filename))
+
             try:
                 decoded_data = base64.b64decode(filedata_b64)
-                with open(filepath, 'wb') as f:
-                    f.write(decoded_data)
+                spool = UploadSpool(self.file_dir)
+                spool.write(decoded_data)
+                base_filename = self.store_upload(filename, spool)
                 return self.response(200, 'OK', f"File '{base_filename}' uploaded successfully to '{self.file_dir}'.".encode('utf-8'), {'Content-Type': 'text/plain'})
             except (base64.binascii.Error, ValueError):
                 return self.response(400, 'Bad Request', b'Invalid base64 data', {})
@@ -183,6 +1182,11 @@ class HttpServer:
             
             try:
                 os.remove(filepath_in_root)
+                self.cache.invalidate(os.path.abspath(filepath_in_root))
+                self.gzip_cache.invalidate(os.path.abspath(filepath_in_root))
+                if base_filename.endswith('.gz'):
+                    # The compressed variant of the original may come from this sidecar
+                    self.gzip_cache.invalidate(os.path.abspath(filepath_in_root[:-3]))
                 return self.response(200, 'OK', f"File '{base_filename}' deleted successfully from server root.".encode('utf-8'), {'Content-Type': 'text/plain'})
             except OSError as e:
                 print(f"Error deleting file {filepath_in_root}: {e}", file=sys.stderr)
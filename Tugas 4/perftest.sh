@@ -3,3 +3,6 @@
 
 ab -n 100 -c 50 http://localhost:8887/testing.txt
 
+
+#keep-alive (HTTP/1.1 persistent connection), satu koneksi dipakai untuk banyak request
+ab -k -n 100 -c 50 http://localhost:8887/testing.txt
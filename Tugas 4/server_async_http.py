@@ -1,51 +1,172 @@
 import socket
+import selectors
 import time
 import sys
-import asyncore
 import logging
-from http import HttpServer
+import os
+import collections
+from http import HttpServer, HttpRequestParser, FileResponse
 
 httpserver = HttpServer()
-rcv = ""
-
-class ProcessTheClient(asyncore.dispatcher_with_send):
-	def handle_read(self):
-		global rcv
-		data = self.recv(1024)
-		if data:
-			d = data.decode()
-			rcv = rcv + d
-			if rcv[-2:] == '\r\n':
-				# end of command, proses string
-				logging.warning("data dari client: {}".format(rcv))
-				hasil = httpserver.proses(rcv)
-				#hasil sudah dalam bentuk bytes
-				hasil = hasil + "\r\n\r\n".encode()
-				#agar bisa dioperasikan dengan string \r\n\r\n maka harus diencode dulu => bytes
-				logging.warning("balas ke  client: {}".format(hasil))
-				self.send(hasil) #hasil sudah dalam bentuk bytes, kirimkan balik ke client
-				rcv = ""
-				self.close()
-
-		#self.send('HTTP/1.1 200 OK \r\n\r\n'.encode())
-			#self.send("{}" . format(httpserver.proses(d)))
-		self.close()
-
-class Server(asyncore.dispatcher):
-	def __init__(self,portnumber):
-		asyncore.dispatcher.__init__(self)
-		self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
-		self.set_reuse_addr()
-		self.bind(('',portnumber))
-		self.listen(1)
+
+class ClientState:
+	#state per koneksi: parser sendiri (request bisa datang terpotong di beberapa recv)
+	#dan antrian response yang belum terkirim
+	def __init__(self, connection, address):
+		self.connection = connection
+		self.address = address
+		self.parser = HttpRequestParser(spool=httpserver.upload_spool)
+		self.jumlah_request = 0
+		self.closing = False
+		self.last_active = time.time()
+		self.events = selectors.EVENT_READ
+		#antrian data yang belum terkirim, berurutan: bytes, [file, offset, count]
+		#(bagian isi file) atau FileResponse (penanda file sudah selesai dikirim)
+		self.antrian = collections.deque()
+
+	def proses(self, data):
+		#proses semua request yang sudah lengkap (keep-alive / pipelining)
+		for request in self.parser.feed(data):
+			self.jumlah_request += 1
+			logging.warning("data dari client: {} {}".format(request.method, request.path))
+			hasil, keep_alive = httpserver.handle_request(request, self.jumlah_request < httpserver.max_keep_alive_requests)
+			if isinstance(hasil, FileResponse):
+				#header, bagian-bagian file (range) dan pembatas multipart
+				for piece in hasil.pieces:
+					if isinstance(piece, tuple):
+						self.antrian.append([hasil.file, piece[0], piece[1]])
+					else:
+						self.antrian.append(piece)
+			self.antrian.append(hasil)
+			if not keep_alive:
+				#request setelahnya diabaikan, koneksi ditutup setelah antrian terkirim
+				self.closing = True
+				break
+
+	def kirim(self):
+		#kirim antrian sebanyak yang diterima socket tanpa blocking,
+		#isi file dikirim dengan os.sendfile langsung dari page cache.
+		#BlockingIOError berarti buffer socket penuh, lanjut saat EVENT_WRITE
+		while self.antrian:
+			item = self.antrian[0]
+			try:
+				if isinstance(item, list):
+					while item[2]:
+						sent = os.sendfile(self.connection.fileno(), item[0].fileno(), item[1], item[2])
+						if not sent:
+							raise OSError("file berubah saat dikirim")
+						item[1] += sent
+						item[2] -= sent
+				elif isinstance(item, FileResponse):
+					item.close()
+				else:
+					sent = self.connection.send(item)
+					if sent < len(item):
+						self.antrian[0] = memoryview(item)[sent:]
+						return
+			except (BlockingIOError, InterruptedError):
+				return
+			self.antrian.popleft()
+
+	def close(self):
+		while self.antrian:
+			item = self.antrian.popleft()
+			if isinstance(item, FileResponse):
+				item.close()
+		self.connection.close()
+
+class Server:
+	#satu thread, event-driven: DefaultSelector memakai epoll di Linux, kqueue di BSD/macOS
+	def __init__(self, portnumber):
+		self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.my_socket.bind(('', portnumber))
+		self.my_socket.listen(1024)
+		self.my_socket.setblocking(False)
+		self.selector = selectors.DefaultSelector()
+		self.selector.register(self.my_socket, selectors.EVENT_READ, None)
 		logging.warning("running on port {}" . format(portnumber))
+		self.idle_check = time.time()
+
+	def run(self):
+		while True:
+			#timeout agar koneksi idle tetap diperiksa walaupun tidak ada event
+			for key, mask in self.selector.select(timeout=1):
+				if key.data is None:
+					self.accept_client()
+					continue
+				state = key.data
+				if mask & selectors.EVENT_READ:
+					self.read_client(state)
+				if mask & selectors.EVENT_WRITE and state.connection.fileno() != -1:
+					self.write_client(state)
+			#pemeriksaan idle cukup sekali per detik, bukan setiap select()
+			#(dengan ribuan koneksi scan semua koneksi itu mahal)
+			if time.time() - self.idle_check >= 1:
+				self.idle_check = time.time()
+				self.close_idle()
 
-	def handle_accept(self):
-		pair = self.accept()
-		if pair is not None:
-			sock, addr = pair
-			logging.warning("connection from {}" . format(repr(addr)))
-			handler = ProcessTheClient(sock)
+	def accept_client(self):
+		#terima semua koneksi yang sedang antri
+		while True:
+			try:
+				connection, client_address = self.my_socket.accept()
+			except (BlockingIOError, InterruptedError):
+				return
+			logging.warning("connection from {}" . format(repr(client_address)))
+			connection.setblocking(False)
+			state = ClientState(connection, client_address)
+			self.selector.register(connection, selectors.EVENT_READ, state)
+
+	def read_client(self, state):
+		try:
+			data = state.connection.recv(65536)
+		except (BlockingIOError, InterruptedError):
+			return
+		except OSError as e:
+			logging.warning("error: {}".format(e))
+			self.close_client(state)
+			return
+		if not data:
+			self.close_client(state)
+			return
+		state.last_active = time.time()
+		state.proses(data)
+		self.write_client(state)
+
+	def write_client(self, state):
+		if state.antrian:
+			state.last_active = time.time()
+			try:
+				state.kirim()
+			except OSError as e:
+				logging.warning("error: {}".format(e))
+				self.close_client(state)
+				return
+		if state.closing and not state.antrian:
+			#koneksi baru ditutup setelah semua response terkirim
+			self.close_client(state)
+			return
+		#selama masih ada response yang belum terkirim, request berikutnya tidak dibaca
+		#dulu (backpressure untuk client yang pipelining tanpa membaca response)
+		if state.antrian:
+			events = selectors.EVENT_WRITE
+		else:
+			events = selectors.EVENT_READ
+		if events != state.events:
+			self.selector.modify(state.connection, events, state)
+			state.events = events
+
+	def close_idle(self):
+		#tutup koneksi keep-alive yang idle lebih dari keep_alive_timeout
+		batas = time.time() - httpserver.keep_alive_timeout
+		for key in list(self.selector.get_map().values()):
+			if key.data is not None and key.data.last_active < batas:
+				self.close_client(key.data)
+
+	def close_client(self, state):
+		self.selector.unregister(state.connection)
+		state.close()
 
 def main():
 	portnumber=8887
@@ -54,8 +175,7 @@ def main():
 	except:
 		pass
 	svr = Server(portnumber)
-	asyncore.loop()
+	svr.run()
 
 if __name__=="__main__":
 	main()
-
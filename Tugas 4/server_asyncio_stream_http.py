@@ -4,30 +4,128 @@ import time
 import sys
 import logging
 import multiprocessing
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import asyncio
-from http import HttpServer
+import collections
+from http import HttpServer, HttpRequestParser, FileResponse
 
 httpserver = HttpServer()
 
+#thread pool untuk semua pekerjaan yang menyentuh disk (stat, open, upload, gzip),
+#event loop hanya mengurus socket
+executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='http-io')
+
+#jumlah request pipelining yang boleh menunggu sebelum pembacaan socket ditahan
+MAX_ANTRIAN = 16
+
 class ProcessTheClient(asyncio.Protocol):
 		def connection_made(self, transport):
 			peername = transport.get_extra_info('peername')
 			print('Connection from {}'.format(peername))
 			self.transport = transport
-			self.rcv = ""
+			self.parser = HttpRequestParser(spool=httpserver.upload_spool)
+			self.jumlah_request = 0
+			self.antrian = collections.deque()
+			self.task = None
+			self.idle = None
+			#flow control: spool_sibuk saat body besar sedang ditulis ke disk di executor,
+			#bisa_tulis di-clear oleh pause_writing saat buffer transport penuh
+			self.spool_sibuk = False
+			self.bisa_tulis = asyncio.Event()
+			self.bisa_tulis.set()
+			self.reset_idle()
+		def reset_idle(self):
+			#koneksi keep-alive ditutup jika idle lebih dari keep_alive_timeout
+			if self.idle:
+				self.idle.cancel()
+			self.idle = asyncio.get_running_loop().call_later(httpserver.keep_alive_timeout, self.transport.close)
+		def connection_lost(self, exc):
+			if self.idle:
+				self.idle.cancel()
+			#bangunkan layani() yang sedang menunggu drain agar bisa selesai
+			self.bisa_tulis.set()
+		def pause_writing(self):
+			self.bisa_tulis.clear()
+		def resume_writing(self):
+			self.bisa_tulis.set()
+		def atur_baca(self):
+			#pembacaan socket ditahan selama body sedang ditulis ke disk atau
+			#terlalu banyak request yang belum dijawab (backpressure ke client)
+			if self.transport.is_closing():
+				return
+			if self.spool_sibuk or len(self.antrian) >= MAX_ANTRIAN:
+				self.transport.pause_reading()
+			else:
+				self.transport.resume_reading()
 		def data_received(self, data: bytes) -> None:
+			self.reset_idle()
+			if self.parser.spooling:
+				#lanjutan body besar (upload): penulisan ke file sementara di executor,
+				#data berikutnya baru dibaca setelah selesai sehingga urutannya terjaga
+				self.spool_sibuk = True
+				self.atur_baca()
+				asyncio.get_running_loop().create_task(self.spool(data))
+			else:
+				self.terima(self.parser.feed(data))
+		async def spool(self, data):
+			try:
+				requests = await asyncio.get_running_loop().run_in_executor(executor, self.parser.feed, data)
+			except Exception as e:
+				#misalnya disk penuh: parser tidak bisa dilanjutkan, koneksi ditutup
+				logging.warning("error: {}".format(e))
+				self.transport.close()
+				return
+			finally:
+				self.spool_sibuk = False
+			self.terima(requests)
+		def terima(self, requests):
+			#request yang sudah lengkap diantrikan dan dijawab berurutan oleh satu task,
+			#karena selama loop.sendfile berjalan transport tidak boleh ditulis
+			self.antrian.extend(requests)
+			self.atur_baca()
+			if self.antrian and (self.task is None or self.task.done()):
+				self.task = asyncio.get_running_loop().create_task(self.layani())
+		async def layani(self):
+			loop = asyncio.get_running_loop()
+			#selama request diproses koneksi tidak dianggap idle
+			self.idle.cancel()
 			try:
-				d = data.decode()
-				self.rcv=self.rcv+d
-				if self.rcv[-2:]=='\r\n':
-					hasil = httpserver.proses(self.rcv)
-					hasil=hasil+"\r\n\r\n".encode()
-					self.transport.write(hasil)
-					self.transport.close()
-					self.rcv=""
-			except OSError as e:
-				pass
+				while self.antrian and not self.transport.is_closing():
+					request = self.antrian.popleft()
+					self.atur_baca()
+					self.jumlah_request += 1
+					try:
+						hasil, keep_alive = await httpserver.handle_request_async(request, self.jumlah_request < httpserver.max_keep_alive_requests, executor)
+					except Exception as e:
+						#error tak terduga tetap dijawab, lalu koneksi ditutup
+						logging.warning("error: {}".format(e))
+						hasil, keep_alive = httpserver.response(500, 'Internal Server Error', f'Error processing request: {str(e)}'.encode('utf-8'), {}), False
+					try:
+						if isinstance(hasil, FileResponse):
+							#isi file dikirim oleh kernel (os.sendfile), tanpa dibaca ke memori;
+							#loop.sendfile sendiri menunggu socket siap ditulis
+							for piece in hasil.pieces:
+								if not isinstance(piece, tuple):
+									self.transport.write(piece)
+								elif piece[1]:
+									await self.bisa_tulis.wait()
+									await loop.sendfile(self.transport, hasil.file, piece[0], piece[1])
+						else:
+							self.transport.write(hasil)
+						#jangan memproses request berikutnya selama buffer transport penuh
+						await self.bisa_tulis.wait()
+					except Exception as e:
+						logging.warning("error: {}".format(e))
+						self.transport.close()
+					finally:
+						if isinstance(hasil, FileResponse):
+							hasil.close()
+					if not keep_alive:
+						#close() menunggu sisa data di buffer terkirim
+						self.transport.close()
+			finally:
+				if not self.transport.is_closing():
+					self.reset_idle()
 
 
 
@@ -36,7 +134,7 @@ async def Server():
 
 	server = await loop.create_server(
 		lambda: ProcessTheClient(),
-		'0.0.0.0', 8886)
+		'0.0.0.0', 8886, backlog=1024)
 
 	async with server:
 		await server.serve_forever()
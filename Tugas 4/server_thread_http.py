@@ -4,7 +4,7 @@ import threading
 import time
 import sys
 import logging
-from http import HttpServer
+from http import HttpServer, HttpRequestParser, send_response
 
 httpserver = HttpServer()
 
@@ -16,31 +16,30 @@ class ProcessTheClient(threading.Thread):
 		threading.Thread.__init__(self)
 
 	def run(self):
-		rcv=""
-		while True:
+		parser=HttpRequestParser(spool=httpserver.upload_spool)
+		jumlah_request=0
+		# koneksi tetap dibuka untuk request berikutnya (HTTP/1.1 keep-alive) sampai
+		# client menutup koneksi, idle lebih dari keep_alive_timeout, atau batas request tercapai
+		self.connection.settimeout(httpserver.keep_alive_timeout)
+		keep_alive = True
+		while keep_alive:
 			try:
-				data = self.connection.recv(32)
-				if data:
-					#merubah input dari socket (berupa bytes) ke dalam string
-					#agar bisa mendeteksi \r\n
-					d = data.decode()
-					rcv=rcv+d
-					if rcv[-2:]=='\r\n':
-						#end of command, proses string
-						logging.warning("data dari client: {}" . format(rcv))
-						hasil = httpserver.proses(rcv)
-						#hasil akan berupa bytes
-						#untuk bisa ditambahi dengan string, maka string harus di encode
-						hasil=hasil+"\r\n\r\n".encode()
-						logging.warning("balas ke  client: {}" . format(hasil))
-						#hasil sudah dalam bentuk bytes
-						self.connection.sendall(hasil)
-						rcv=""
-						self.connection.close()
-				else:
+				data = self.connection.recv(4096)
+				if not data:
 					break
+				#parser menerima bytes apa adanya, satu recv bisa berisi
+				#sebagian request atau beberapa request sekaligus (pipelining)
+				for request in parser.feed(data):
+					jumlah_request+=1
+					logging.warning("data dari client: {} {}" . format(request.method, request.path))
+					hasil, keep_alive = httpserver.handle_request(request, jumlah_request < httpserver.max_keep_alive_requests)
+					#hasil berupa bytes, atau FileResponse yang isinya dikirim dengan sendfile
+					send_response(self.connection, hasil)
+					if not keep_alive:
+						break
 			except OSError as e:
-				pass
+				#termasuk socket.timeout saat koneksi idle terlalu lama
+				break
 		self.connection.close()
 
 
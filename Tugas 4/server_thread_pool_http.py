@@ -3,82 +3,45 @@ import socket
 import sys
 import logging
 from concurrent.futures import ThreadPoolExecutor
-from http import HttpServer 
+from http import HttpServer, HttpRequestParser, send_response 
 
 httpserver = HttpServer()
 
 def ProcessTheClient(connection, address):
     logging.info(f"Connection accepted from {address}")
-    rcv = b""
-    headers_ended = False
-    content_length = 0
+    parser = HttpRequestParser(spool=httpserver.upload_spool)
+    request_count = 0
     request_line_info = "N/A"
+    # Keep the connection open for further requests (HTTP/1.1 keep-alive) until the
+    # client closes it, it idles past keep_alive_timeout or the request limit is hit
+    connection.settimeout(httpserver.keep_alive_timeout)
+    keep_alive = True
 
     try:
-        while True:
+        while keep_alive:
             try:
-                data = connection.recv(1024*1024) 
-                if data:
-                    rcv += data
-                    if not headers_ended:
-                        if b"\r\n\r\n" in rcv:
-                            headers_ended = True
-                            header_bytes, rest_bytes = rcv.split(b"\r\n\r\n", 1)
-                            
-                            try:
-                                request_line_info = header_bytes.decode(errors='ignore').split("\r\n")[0]
-                            except IndexError:
-                                request_line_info = "Malformed Request Line"
-                            logging.info(f"Client {address}: Request: {request_line_info}")
-
-                            header_str = header_bytes.decode(errors='ignore')
-                            for line in header_str.split("\r\n"):
-                                if line.lower().startswith("content-length:"):
-                                    try:
-                                        content_length = int(line.split(":", 1)[1].strip())
-                                    except ValueError:
-                                        logging.warning(f"Client {address}: Invalid Content-Length value in '{line.strip()}' for request '{request_line_info}'")
-                                        content_length = 0 
-                            
-                            body = rest_bytes
-                            if content_length > 0:
-                                while len(body) < content_length:
-                                    more = connection.recv(1024*1024)
-                                    if not more:
-                                        logging.warning(f"Client {address}: Connection closed by client while reading body for '{request_line_info}'. Received {len(body)}/{content_length} bytes.")
-                                        break 
-                                    body += more
-                            
-                            full_request_str = (header_bytes + b"\r\n\r\n" + body).decode(errors='ignore')
-                            hasil = httpserver.proses(full_request_str)
-                            connection.sendall(hasil + b"\r\n\r\n") # Ensure this is the correct way to send for thread pool
-                            return 
-                    else: 
-                        # try:
-                        #     request_line_info = rcv.decode(errors='ignore').split('\r\n')[0] if rcv else "Unknown (in 'else headers_ended' branch)" # Debug info
-                        # except IndexError:
-                        #     request_line_info = "Malformed Request Line (in 'else headers_ended' branch)" # Debug info
-                        # logging.warning(f"Client {address}: Reached 'headers_ended==True' branch. Processing potentially incomplete request: {request_line_info}") # Debug log
-                        
-                        hasil = httpserver.proses(rcv.decode(errors='ignore'))
-                        connection.sendall(hasil + b"\r\n\r\n")
-                        return 
-                else: 
-                    if rcv and not headers_ended : 
-                        try:
-                            request_line_info = rcv.decode(errors='ignore').split('\r\n')[0]
-                        except IndexError:
-                            request_line_info = "Malformed Request Line (partial data)"
-                        logging.info(f"Client {address}: Connection closed by client with partial data. Processing as simple request: {request_line_info}")
-                        hasil = httpserver.proses(rcv.decode(errors='ignore'))
-                        connection.sendall(hasil + b"\r\n\r\n")
-                        return
-                    break 
+                data = connection.recv(1024*1024)
+                if not data:
+                    if parser.buf or parser.pending:
+                        logging.info(f"Client {address}: Connection closed by client with an incomplete request.")
+                    break
+                # The parser takes raw bytes; one recv may carry part of a request
+                # or several pipelined requests
+                for request in parser.feed(data):
+                    request_count += 1
+                    request_line_info = f"{request.method} {request.path} {request.version}"
+                    logging.info(f"Client {address}: Request #{request_count}: {request_line_info}")
+                    hasil, keep_alive = httpserver.handle_request(request,
+                                                                  request_count < httpserver.max_keep_alive_requests)
+                    # File bodies go out via sendfile, without being read into memory
+                    send_response(connection, hasil)
+                    if not keep_alive:
+                        break
+            except socket.timeout:
+                logging.info(f"Client {address}: Idle for {httpserver.keep_alive_timeout}s, closing.")
+                break
             except OSError as e:
                 logging.error(f"Client {address}: OSError in communication loop: {e}. Request hint: {request_line_info}")
-                break 
-            except ValueError as e: 
-                logging.error(f"Client {address}: ValueError processing request data (e.g. Content-Length): {e}. Request hint: {request_line_info}")
                 break
             except Exception as e:
                 logging.exception(f"Client {address}: Unexpected error in communication loop for request hint '{request_line_info}': {e}")